@@ -0,0 +1,195 @@
+"""Deterministic transfer-and-reorder plans for one part at one site.
+
+Applies the decision rules of INVENTORY_RECOMMENDATION_PROMPT directly to the gold table columns:
+transfer the minimum quantity that restores the site's safety stock, only from sites that are
+themselves stocked and only out of their available_for_transfer (so no source breaches its safety
+stock), and order from the vendor with the shortest lead time, then highest reliability, respecting
+minimum order quantities, for whatever transfers cannot cover or a transfer leaves a source short.
+"""
+import math
+from dataclasses import dataclass, field, asdict
+import numpy as np
+import pandas as pd
+
+NO_ACTION = "**No action required – site is at or above safety stock.**"
+_NUMERIC = ['lat', 'lon', 'on_hand_stock', 'safety_stock', 'shortage_quantity', 'projected_available_stock',
+            'available_for_transfer', 'lead_time_days', 'reliability', 'min_order_quantity']
+
+
+@dataclass(frozen=True)
+class Transfer:
+    source: str
+    destination: str
+    qty: int
+    distance_km: float
+    source_available_after: int  # units the source can still give without breaching safety stock
+    source_weakened: bool  # its own planned work orders would now take it below safety stock
+
+
+@dataclass(frozen=True)
+class VendorOrder:
+    vendor_id: str
+    site: str
+    qty: int
+    lead_time_days: int  # None when the vendor has no lead time on record
+    reliability: float  # None when unknown
+    min_order_quantity: int
+    reason: str  # 'shortfall' (need transfers cannot cover) or 'replenish source'
+
+
+@dataclass
+class AllocationPlan:
+    part: str
+    site: str
+    need: int  # units missing to restore safety stock at the site (worst work order)
+    transfers: list = field(default_factory=list)
+    orders: list = field(default_factory=list)
+    shortfall: int = 0  # part of need no internal source can cover
+    notes: list = field(default_factory=list)
+
+    @property
+    def action_required(self):
+        return self.need > 0
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_markdown(self):
+        """The plan in the output structure of INVENTORY_RECOMMENDATION_PROMPT"""
+        if not self.action_required:
+            return NO_ACTION
+        moved = sum(t.qty for t in self.transfers)
+        lines = [f"## Recommended Action for Part {self.part}", "", "### 1️⃣ Transfer Stock Now (Fixes the Issue)", "",
+                 "| From | To | Qty | Impact |", "|---|---|---:|---|"]
+        for t in self.transfers:
+            impact = "Restores safety stock" if moved >= self.need else f"Covers {t.qty} of {self.need} units short"
+            lines.append(f"| {t.source} | {t.destination} | {t.qty} | {impact} |")
+        if not self.transfers:
+            lines.append(f"| – | {self.site} | 0 | No site has stock above its safety stock |")
+        lines += ["", f"- {self.site}: " + (f"{moved} units arrive, restoring safety stock ({self.need} units short)"
+                                          if not self.shortfall else
+                                          f"{self.shortfall} of {self.need} units stay short until the vendor order arrives")]
+        for t in self.transfers:
+            lines.append(f"- {t.source}: planned work orders now take it below safety stock" if t.source_weakened else
+                         f"- {t.source}: stays at or above safety stock ({t.source_available_after} units still transferable)")
+        lines += ["", "### 2️⃣ Reorder to Protect Source Site (Prevents Next Issue)", ""]
+        if self.orders:
+            lines += ["| Vendor | Qty | Lead Time |", "|---|---:|---:|"]
+            lines += [f"| {o.vendor_id} | {o.qty} | "
+                      f"{f'{o.lead_time_days} days' if o.lead_time_days is not None else 'lead time unknown'} |"
+                      for o in self.orders]
+            lines.append("")
+            for o in self.orders:
+                why = "covers the remaining shortage" if o.reason == 'shortfall' else "restores its safety stock after the transfer"
+                moq = f" (minimum order {o.min_order_quantity})" if o.qty == o.min_order_quantity else ""
+                reliability = f"{o.reliability:.0%}" if o.reliability is not None else "unknown"
+                lines.append(f"- {o.site}: {o.qty} units{moq} {why}; vendor reliability {reliability}")
+        else:
+            lines.append("No reorder needed – every source site stays at or above safety stock.")
+        lines += [f"- {note}" for note in self.notes]
+        return "\n".join(lines)
+
+
+def _numeric(df):
+    return df.assign(**{c: pd.to_numeric(df[c], errors='coerce') for c in _NUMERIC if c in df.columns})
+
+
+def site_positions(rows):
+    """One row per site: the part's stock position there (constant per site in the gold table) and its
+    worst work order (largest shortage, lowest projected stock)"""
+    rows = _numeric(rows)
+    return rows.groupby('plant_name', observed=True, sort=True).agg(
+        lat=('lat', 'first'), lon=('lon', 'first'), safety_stock=('safety_stock', 'max'),
+        available=('available_for_transfer', 'max'), shortage=('shortage_quantity', 'max'),
+        projected=('projected_available_stock', 'min'))
+
+
+def vendor_options(rows):
+    """Distinct vendors for the part, best first: shortest lead time, then highest reliability.
+
+    Missing terms sort last, so a vendor keeps a row with complete terms if it has one and vendors
+    with known terms are preferred over those without.
+    """
+    cols = ['vendor_id', 'lead_time_days', 'reliability', 'min_order_quantity']
+    if not set(cols) <= set(rows.columns):
+        return pd.DataFrame(columns=cols)
+    order = ['lead_time_days', 'reliability', 'min_order_quantity', 'vendor_id']
+    vendors = _numeric(rows[cols].dropna(subset=['vendor_id']))
+    # Best terms first, so each vendor keeps its best row whatever the input order
+    vendors = vendors.sort_values(order, ascending=[True, False, True, True], na_position='last')
+    return vendors.drop_duplicates('vendor_id')
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
+
+def _order(vendors, site, qty, reason):
+    """Order from the best vendor, raised to its minimum order quantity"""
+    v = vendors.iloc[0]
+    moq = int(v['min_order_quantity']) if pd.notna(v['min_order_quantity']) else 0
+    lead = int(v['lead_time_days']) if pd.notna(v['lead_time_days']) else None
+    reliability = float(v['reliability']) if pd.notna(v['reliability']) else None
+    return VendorOrder(str(v['vendor_id']), site, max(qty, moq), lead, reliability, moq, reason)
+
+
+def plan_allocation(part, site, stock_issue, part_rows):
+    """AllocationPlan for part at site.
+
+    stock_issue holds the dashboard's rows for the site (any filters applied); part_rows holds the
+    part's rows at every site, the source of transfer capacity and vendors.
+    """
+    issue = stock_issue
+    if not issue.empty and 'plant_name' in issue.columns:
+        issue = issue[(issue['plant_name'] == site) & (issue['part_name'] == part)] if 'part_name' in issue.columns \
+            else issue[issue['plant_name'] == site]
+    if issue.empty:
+        issue = part_rows[part_rows['plant_name'] == site] if not part_rows.empty else part_rows
+    shortage = _numeric(issue)['shortage_quantity'].max() if 'shortage_quantity' in issue.columns else np.nan
+    plan = AllocationPlan(part, site, int(math.ceil(shortage)) if pd.notna(shortage) and shortage > 0 else 0)
+    if not plan.action_required or part_rows.empty:
+        return plan
+
+    positions = site_positions(part_rows)
+    here = positions.loc[site] if site in positions.index else None
+    # Sources: stocked sites (no work order short) with whole units above safety stock
+    sources = positions[(positions.index != site) & (positions['shortage'].fillna(0) <= 0)].copy()
+    sources['capacity'] = np.floor(sources['available'].fillna(0)).astype(int)
+    sources = sources[sources['capacity'] > 0]
+    sources['distance_km'] = (_distance_km(here['lat'], here['lon'], sources['lat'], sources['lon'])
+                              if here is not None else np.nan)
+    sources = sources.reset_index().sort_values(['distance_km', 'plant_name'], na_position='last')
+
+    # One source that covers the whole need (fewest trips), preferring one its own work orders can spare
+    # the stock for, then the nearest; otherwise split across the largest sources
+    whole = sources[sources['capacity'] >= plan.need]
+    if not whole.empty:
+        spare = whole['projected'] - plan.need >= whole['safety_stock']
+        picks = [(whole[spare] if spare.any() else whole).iloc[0]]
+        amounts = [plan.need]
+    else:
+        picks, amounts, left = [], [], plan.need
+        for _, s in sources.sort_values(['capacity', 'distance_km'], ascending=[False, True]).iterrows():
+            if left <= 0:
+                break
+            picks.append(s)
+            amounts.append(min(left, int(s['capacity'])))
+            left -= amounts[-1]
+
+    vendors = vendor_options(part_rows)
+    for s, qty in zip(picks, amounts):
+        after = s['projected'] - qty
+        weakened = bool(pd.notna(after) and after < s['safety_stock'])
+        plan.transfers.append(Transfer(s['plant_name'], site, qty, round(float(s['distance_km']), 1),
+                                       int(s['capacity'] - qty), weakened))
+        if weakened and not vendors.empty:
+            plan.orders.append(_order(vendors, s['plant_name'], int(math.ceil(s['safety_stock'] - after)), 'replenish source'))
+    plan.shortfall = plan.need - sum(amounts)
+    if plan.shortfall > 0:
+        if vendors.empty:
+            plan.notes.append(f"No vendor is listed for {part}; {plan.shortfall} units cannot be sourced")
+        else:
+            plan.orders.append(_order(vendors, site, plan.shortfall, 'shortfall'))
+    return plan
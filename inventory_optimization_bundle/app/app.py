@@ -1,47 +1,142 @@
 """Mining Parts Inventory Dashboard"""
+import hashlib
+import json
 import os
-from dash import Dash, html, dcc, Input, Output, callback_context, State
+import time
+from functools import lru_cache
+from dash import Dash, html, dcc, Input, Output, callback_context, State, no_update, ClientsideFunction
+from flask import jsonify, request
+from flask_caching import Cache
 import pandas as pd
-import dash_leaflet as dl
-from utils import get_connection, read_table, call_databricks_llm
+from utils import get_pool, call_databricks_llm, stream_databricks_llm
 from layout import create_layout, DB_COLORS, create_modal
-from prompts import INVENTORY_RECOMMENDATION_PROMPT
+from prompts import INVENTORY_RECOMMENDATION_PROMPT, ALLOCATION_NARRATION_PROMPT
+from allocation import plan_allocation
+from prompt_context import build_prompt, estimate_tokens
 from chat_assistant import get_chat_response, get_quick_insights
+from inventory_loader import InventoryLoader
+from backends import DashboardFilters, LocalBackend, WarehouseBackend, GRID_COLUMNS
+from memo import DashboardCache, RecommendationCache, frame_digest
+from grid_rows import GridPager
+from wire import encode_columns
+from markers import MarkerBuilder, patch_markers, site_geobuf, site_tooltips, tooltip_html, RISK_COLORS
+from timing import OutputTimer
+from jobs import JobQueue, QueueFull
+from snapshot import SnapshotManager
+from snapshot_cache import SnapshotCache
+
+# Copy-on-write for the whole process: InventoryStore hands callbacks the snapshot's frames without
+# copying them, and any in-place change on one must copy rather than alter the shared snapshot
+pd.set_option('mode.copy_on_write', True)
 
 # Configuration - use environment variables for sensitive data
 HTTP_PATH = os.getenv("DATABRICKS_WAREHOUSE_HTTP_PATH", "/sql/1.0/warehouses/148ccb90800933a1")
 TABLE_NAME = os.getenv("DATABRICKS_TABLE_NAME", "`rz_demo`.`supply_chain`.`gold_master_part_inventory`")
+SNAPSHOT_REFRESH_SECONDS = int(os.getenv("SNAPSHOT_REFRESH_SECONDS", "900"))  # 0 = refresh only on demand
+SNAPSHOT_POLL_SECONDS = int(os.getenv("SNAPSHOT_POLL_SECONDS", "60"))
+STARTUP_POLL_MS = 2000  # poll faster until the first snapshot is ready
+SNAPSHOT_LOAD_MODE = os.getenv("SNAPSHOT_LOAD_MODE", "version")  # full | version | column
+SNAPSHOT_WATERMARK_COLUMN = os.getenv("SNAPSHOT_WATERMARK_COLUMN")  # required for mode "column"
+# Optional pushdown for site-specific deployments: comma-separated column list and plant_id scope
+SNAPSHOT_COLUMNS = [c.strip() for c in os.getenv("SNAPSHOT_COLUMNS", "").split(",") if c.strip()]
+SITE_SCOPE = [p.strip() for p in os.getenv("SITE_SCOPE", "").split(",") if p.strip()]
+SNAPSHOT_FILTERS = [('plant_id', 'IN', SITE_SCOPE)] if SITE_SCOPE else []
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", "100000"))  # rows per streamed fetch, 0 = single fetch
+SNAPSHOT_CACHE_PATH = os.getenv("SNAPSHOT_CACHE_PATH", "/tmp/inventory_snapshot.arrow")  # empty = no local cache
+SNAPSHOT_CACHE_MAX_AGE_SECONDS = int(os.getenv("SNAPSHOT_CACHE_MAX_AGE_SECONDS", str(24 * 3600)))
+# 0 = skip the SHA-256 pass over the cache file on startup (Arrow still validates its structure, but changed
+# values would go unnoticed)
+SNAPSHOT_CACHE_VERIFY = os.getenv("SNAPSHOT_CACHE_VERIFY", "1") not in ('0', 'false')
+# local = filter the in-memory snapshot; warehouse = aggregate SQL per filter change (tables too big for memory)
+DASHBOARD_BACKEND = os.getenv("DASHBOARD_BACKEND", "local")
+WAREHOUSE_CACHE_SIZE = int(os.getenv("WAREHOUSE_CACHE_SIZE", "256"))  # cached query results per worker
+WAREHOUSE_GRID_LIMIT = int(os.getenv("WAREHOUSE_GRID_LIMIT", "10000"))  # max grid rows per warehouse query
+# In warehouse mode the snapshot only holds the distinct dimensions behind the filter options and map
+DIMENSION_COLUMNS = ['plant_id', 'plant_name', 'lat', 'lon', 'equip_name', 'part_name']
+# Rendered dashboard outputs per filter combination: per-worker LRU, plus an optional flask-caching
+# backend shared by all workers (NullCache = none, FileSystemCache, RedisCache, ...)
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "64"))
+DASHBOARD_CACHE_TYPE = os.getenv("DASHBOARD_CACHE_TYPE", "NullCache")
+DASHBOARD_CACHE_DIR = os.getenv("DASHBOARD_CACHE_DIR", "/tmp/dashboard_cache")
+DASHBOARD_CACHE_REDIS_URL = os.getenv("DASHBOARD_CACHE_REDIS_URL")
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv("DASHBOARD_CACHE_TIMEOUT", "3600"))
+# clientSide = send every filtered row to the grid; infinite = the grid fetches sorted/filtered blocks on demand
+GRID_ROW_MODEL = os.getenv("GRID_ROW_MODEL", "clientSide")
+GRID_BLOCK_SIZE = int(os.getenv("GRID_BLOCK_SIZE", "100"))
+# records = one dict per row; columnar = column arrays with dictionary-encoded strings, decoded in the browser
+GRID_WIRE_FORMAT = os.getenv("GRID_WIRE_FORMAT", "records")
+# markers = one CircleMarker component per site; geojson = one clustered geobuf layer with tooltips loaded on hover
+MAP_MARKER_MODE = os.getenv("MAP_MARKER_MODE", "markers")
+# engine = local transfer/reorder plan; narrate = the same plan explained by the LLM; llm = the LLM works out the plan
+AI_RECOMMENDATION_MODE = os.getenv("AI_RECOMMENDATION_MODE", "engine")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))  # estimated tokens per recommendation prompt (llm mode)
+LLM_ENDPOINT = os.getenv("LLM_ENDPOINT", "databricks-claude-sonnet-4-5")
+LLM_MAX_TOKENS = 3000
+# stream = show the recommendation as it is generated (blocking call if the endpoint cannot stream); blocking = wait for all of it
+LLM_CALL_MODE = os.getenv("LLM_CALL_MODE", "stream")
+# Recommendations run as background jobs so LLM latency never holds a request thread
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))
+AI_JOB_MAX_PENDING = int(os.getenv("AI_JOB_MAX_PENDING", "16"))  # queued + running jobs before new ones are refused
+AI_JOB_POLL_MS = int(os.getenv("AI_JOB_POLL_MS", "500"))
+# Finished recommendations by part, site, filters and a hash of their input rows: per-worker LRU with a TTL,
+# plus an optional flask-caching backend (NullCache = none, FileSystemCache to keep answers on disk, RedisCache, ...)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "128"))
+RECOMMENDATION_CACHE_TTL_SECONDS = int(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "3600"))
+RECOMMENDATION_CACHE_TYPE = os.getenv("RECOMMENDATION_CACHE_TYPE", "NullCache")
+RECOMMENDATION_CACHE_DIR = os.getenv("RECOMMENDATION_CACHE_DIR", "/tmp/recommendation_cache")
+# Changes whenever the prompts or the settings that shape them do, so answers to an old prompt are not reused
+PROMPT_VERSION = hashlib.sha1(repr((AI_RECOMMENDATION_MODE, PROMPT_TOKEN_BUDGET, INVENTORY_RECOMMENDATION_PROMPT,
+                                    ALLOCATION_NARRATION_PROMPT)).encode()).hexdigest()[:12]
 
-# Constants
-RISK_PRIORITY = {'Out of Stock': 1, 'Low Stock': 2, 'Stocked': 3}
-RISK_COLORS = {'Out of Stock': 'red', 'Low Stock': 'gold', 'Stocked': 'green'}
-
-def load_inventory_data():
-    """Load inventory data from Databricks table"""
-    try:
-        print(f"Attempting to load data from: {TABLE_NAME}")
-        print(f"Using warehouse: {HTTP_PATH}")
-        df = read_table(TABLE_NAME, get_connection(HTTP_PATH))
-        print(f"Successfully loaded {len(df)} rows")
-        print(f"Columns: {list(df.columns)}")
-        return df
-    except Exception as e:
-        print(f"!!! ERROR loading data: {e}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
-        return pd.DataFrame()
-
-# Load data and extract unique values for filters
-inventory_data = load_inventory_data()
-sites = sorted(inventory_data['plant_name'].unique()) if not inventory_data.empty else []
-parts = sorted(inventory_data['part_name'].unique()) if not inventory_data.empty else []
-equipment = sorted([e for e in inventory_data.get('equip_name', pd.Series()).unique() if e]) if not inventory_data.empty else []
+# Start serving immediately: use the local cache if there is one and load from the warehouse in the background
+print(f"Using warehouse: {HTTP_PATH}")
+connect = lambda: get_pool(HTTP_PATH).connection()
+if DASHBOARD_BACKEND == 'warehouse':
+    load_inventory_data = InventoryLoader(TABLE_NAME, connect, mode='full', key=(), batch_size=READ_BATCH_SIZE,
+                                          columns=DIMENSION_COLUMNS, where=SNAPSHOT_FILTERS, distinct=True)
+else:
+    load_inventory_data = InventoryLoader(TABLE_NAME, connect, mode=SNAPSHOT_LOAD_MODE,
+                                          watermark_column=SNAPSHOT_WATERMARK_COLUMN, batch_size=READ_BATCH_SIZE,
+                                          columns=SNAPSHOT_COLUMNS, where=SNAPSHOT_FILTERS)
+snapshot_source = (f"{TABLE_NAME} columns={load_inventory_data.columns or '*'} where={SNAPSHOT_FILTERS}"
+                   f"{' distinct' if load_inventory_data.distinct else ''}")
+snapshot_cache = (SnapshotCache(SNAPSHOT_CACHE_PATH, snapshot_source, SNAPSHOT_CACHE_MAX_AGE_SECONDS,
+                                verify=SNAPSHOT_CACHE_VERIFY) if SNAPSHOT_CACHE_PATH else None)
+snapshots = SnapshotManager(load_inventory_data, interval=SNAPSHOT_REFRESH_SECONDS, cache=snapshot_cache)
+if not snapshots.warm_start():
+    snapshots.request_refresh()
+snapshots.start()
+if DASHBOARD_BACKEND == 'warehouse':
+    backend = WarehouseBackend(TABLE_NAME, connect, where=SNAPSHOT_FILTERS, cache_size=WAREHOUSE_CACHE_SIZE,
+                               grid_limit=WAREHOUSE_GRID_LIMIT)
+else:
+    backend = LocalBackend(snapshots)
+print(f"Dashboard backend: {type(backend).__name__}")
+grid_pager = GridPager(GRID_COLUMNS, encode=encode_columns if GRID_WIRE_FORMAT == 'columnar' else None)
+marker_builder = MarkerBuilder()
+output_timer = OutputTimer()
+ai_jobs = JobQueue(AI_JOB_WORKERS, max_pending=AI_JOB_MAX_PENDING)
 risk_levels = ['Stocked', 'Low Stock', 'Out of Stock']
-map_center = [inventory_data['lat'].mean(), inventory_data['lon'].mean()] if not inventory_data.empty else [-26.65, 152.95]
 
 # Initialize Dash app
 app = Dash(__name__)
+shared_cache = None
+if DASHBOARD_CACHE_TYPE != 'NullCache':
+    shared_cache = Cache(app.server, config={'CACHE_TYPE': DASHBOARD_CACHE_TYPE, 'CACHE_DIR': DASHBOARD_CACHE_DIR,
+                                             'CACHE_REDIS_URL': DASHBOARD_CACHE_REDIS_URL,
+                                             'CACHE_DEFAULT_TIMEOUT': DASHBOARD_CACHE_TIMEOUT,
+                                             'CACHE_THRESHOLD': DASHBOARD_CACHE_SIZE * 8})
+dashboard_cache = DashboardCache(DASHBOARD_CACHE_SIZE, shared=shared_cache, timeout=DASHBOARD_CACHE_TIMEOUT,
+                                 prefix=f"dashboard:{snapshot_source}")
+shared_recommendations = None
+if RECOMMENDATION_CACHE_TYPE != 'NullCache':
+    shared_recommendations = Cache(app.server, config={'CACHE_TYPE': RECOMMENDATION_CACHE_TYPE,
+                                                       'CACHE_DIR': RECOMMENDATION_CACHE_DIR,
+                                                       'CACHE_REDIS_URL': DASHBOARD_CACHE_REDIS_URL,
+                                                       'CACHE_DEFAULT_TIMEOUT': RECOMMENDATION_CACHE_TTL_SECONDS,
+                                                       'CACHE_THRESHOLD': RECOMMENDATION_CACHE_SIZE * 8})
+recommendation_cache = RecommendationCache(RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL_SECONDS,
+                                           shared=shared_recommendations)
 app.index_string = '''<!DOCTYPE html><html><head>{%metas%}<title>{%title%}</title>{%favicon%}{%css%}<style>
 @keyframes spin{0%{transform:rotate(0deg)}100%{transform:rotate(360deg)}}
 .markdown-content table{border-collapse:collapse;width:100%;margin:15px 0;font-family:'DM Sans',sans-serif;font-size:14px}
@@ -51,7 +146,6 @@ app.index_string = '''<!DOCTYPE html><html><head>{%metas%}<title>{%title%}</titl
 .markdown-content table tr:hover{background-color:#EEEDE9}
 </style></head><body>{%app_entry%}<footer>{%config%}{%scripts%}{%renderer%}</footer></body></html>'''
 
-app.layout = create_layout(sites, equipment, parts, risk_levels, map_center)
 
 ai_modal = html.Div([html.Div([html.Div([
     html.H2('AI Suggested Part Allocation', style={'margin': '0 0 20px 0', 'color': DB_COLORS['dark'],
@@ -59,9 +153,11 @@ ai_modal = html.Div([html.Div([html.Div([
     html.Div(id='ai-loading', children=[html.Div([
         html.Div(className='spinner', style={'border': '4px solid #f3f3f3', 'borderTop': f'4px solid {DB_COLORS["primary"]}',
             'borderRadius': '50%', 'width': '40px', 'height': '40px', 'animation': 'spin 1s linear infinite', 'margin': '0 auto 15px auto'}),
-        html.Div('Generating AI recommendations...', style={'textAlign': 'center', 'color': DB_COLORS['dark'], 
-            'fontFamily': 'DM Sans, sans-serif', 'fontSize': '14px'})
+        html.Div('Generating AI recommendations...', id='ai-loading-status', style={'textAlign': 'center',
+            'color': DB_COLORS['dark'], 'fontFamily': 'DM Sans, sans-serif', 'fontSize': '14px'})
     ], style={'textAlign': 'center', 'padding': '40px 20px'})], style={'display': 'none'}),
+    # The running recommendation job; polled until it finishes
+    dcc.Store(id='ai-job'), dcc.Interval(id='ai-job-poller', interval=AI_JOB_POLL_MS, disabled=True),
     html.Div(id='ai-response-content', children=[
         html.P('Click the AI Suggested Part Allocation button to generate recommendations.', 
             style={'marginBottom': '30px', 'color': DB_COLORS['dark'], 'fontFamily': 'DM Sans, sans-serif', 
@@ -95,117 +191,249 @@ welcome_modal = create_modal('welcome-modal', 'Inventory Optimization Control Ce
     "Select a site and part, then click 'Get AI Suggestion' to receive actionable recommendations."
 ], ['welcome-modal-close-button'], ['Get Started'], 'block')
 
-app.layout.children.extend([ai_modal, welcome_modal])
+def snapshot_poll_ms(snap):
+    return SNAPSHOT_POLL_SECONDS * 1000 if snapshots.ready else STARTUP_POLL_MS
+
+def serve_layout():
+    """Build the page from the latest snapshot so new visitors get current filter options"""
+    snap = snapshots.current()
+    layout = create_layout(snap.sites, snap.equipment, snap.parts, risk_levels, snap.map_center,
+                           snap.version, snapshot_poll_ms(snap), GRID_ROW_MODEL, GRID_BLOCK_SIZE, MAP_MARKER_MODE)
+    layout.children.extend([ai_modal, welcome_modal])
+    return layout
+
+app.layout = serve_layout
+
+@app.server.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the web server is up (does not wait for data)"""
+    return jsonify({'status': 'ok'})
+
+@app.server.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: an inventory snapshot (live or cached) has been loaded"""
+    return jsonify({'ready': snapshots.ready, **snapshots.status()}), 200 if snapshots.ready else 503
+
+@app.server.route('/admin/refresh-snapshot', methods=['POST'])
+def admin_refresh_snapshot():
+    """Trigger an immediate background reload of the inventory snapshot (?full=1 skips the incremental path)"""
+    snapshots.request_refresh(full=request.args.get('full') in ('1', 'true'))
+    return jsonify({'status': 'refresh requested', **snapshots.status()}), 202
+
+@app.server.route('/admin/snapshot', methods=['GET'])
+def admin_snapshot_status():
+    return jsonify(snapshots.status())
 
-@app.callback([Output('ai-allocation-button', 'disabled'), Output('ai-allocation-button', 'style')],
-              [Input('site-filter', 'value'), Input('part-filter', 'value')])
-def toggle_ai_button(site, part):
-    """Enable AI button only when both site and part are selected"""
-    enabled = bool(site and part)
-    return not enabled, {'padding': '12px 40px', 'backgroundColor': DB_COLORS['primary'] if enabled else '#cccccc',
-        'color': 'white' if enabled else '#666666', 'border': 'none', 'borderRadius': '8px', 'fontSize': '16px',
-        'fontWeight': '500', 'fontFamily': 'DM Sans, sans-serif', 'cursor': 'pointer' if enabled else 'not-allowed', 
-        'display': 'block', 'margin': '0 auto'}
+@app.server.route('/admin/dashboard-cache', methods=['GET'])
+def admin_dashboard_cache_metrics():
+    return jsonify({**dashboard_cache.metrics(), 'grid_pager': grid_pager.metrics(), 'markers': marker_builder.metrics()})
 
-@app.callback(Output('welcome-modal', 'style'),
-              [Input('welcome-modal-close-button', 'n_clicks'), Input('instructions-button', 'n_clicks')],
+@app.server.route('/admin/recommendation-cache', methods=['GET'])
+def admin_recommendation_cache_metrics():
+    return jsonify({**recommendation_cache.metrics(), 'prompt_version': PROMPT_VERSION, 'endpoint': LLM_ENDPOINT})
+
+@app.server.route('/admin/ai-jobs', methods=['GET'])
+def admin_ai_jobs():
+    return jsonify(ai_jobs.metrics())
+
+@app.server.route('/admin/callback-timing', methods=['GET'])
+def admin_callback_timing():
+    """Per-output render time of the dashboard callbacks"""
+    return jsonify(output_timer.metrics())
+
+@app.server.route('/map/site-tooltip', methods=['GET'])
+def site_tooltip():
+    """Tooltip HTML for one site of the clustered map layer, fetched when the tooltip first opens"""
+    if not snapshots.ready:
+        return '', 503
+    filters = DashboardFilters(*(request.args.get(k) or None for k in ['site', 'equip', 'part', 'risk']))
+    result = backend.query(filters)
+    # Part lists for every site under these filters come from one grouped pass, memoized with the dashboard outputs
+    tooltips = dashboard_cache.get_or_compute(result.token, ('site-tooltips', filters),
+                                              lambda: site_tooltips(result.sites(), result.site_parts()))
+    if request.args.get('plant_id') not in tooltips:
+        return '', 404
+    return tooltip_html(*tooltips[request.args['plant_id']])
+
+@app.server.route('/admin/sql-pool', methods=['GET'])
+def admin_sql_pool_metrics():
+    return jsonify(get_pool(HTTP_PATH).metrics())
+
+@app.callback([Output('snapshot-version', 'data'), Output('understock-map', 'viewport'),
+               Output('snapshot-poller', 'interval')],
+              [Input('snapshot-poller', 'n_intervals')],
+              [State('snapshot-version', 'data'), State('understock-map', 'center'),
+               State('understock-map', 'viewport')],
               prevent_initial_call=True)
-def toggle_welcome(close, instructions):
-    """Show welcome modal on instructions button click, hide on close"""
-    ctx = callback_context
-    return {'display': 'block' if ctx.triggered and ctx.triggered[0]['prop_id'].split('.')[0] == 'instructions-button' else 'none'}
-
-@app.callback([Output('ai-modal', 'style'), Output('ai-loading', 'style', allow_duplicate=True), 
-               Output('ai-response-content', 'style', allow_duplicate=True)],
-              [Input('ai-allocation-button', 'n_clicks'), Input('modal-accept-button', 'n_clicks'),
-               Input('modal-cancel-button', 'n_clicks')], prevent_initial_call=True)
-def toggle_ai_modal(ai, accept, cancel):
-    """Toggle AI modal visibility and loading state"""
-    ctx = callback_context
-    if not ctx.triggered:
-        return {'display': 'none'}, {'display': 'none'}, {'display': 'block'}
-    return ({'display': 'block'}, {'display': 'block'}, {'display': 'none'}) if ctx.triggered[0]['prop_id'].split('.')[0] == 'ai-allocation-button' else ({'display': 'none'}, {'display': 'none'}, {'display': 'block'})
-
-@app.callback([Output('map-markers', 'children'), Output('kpi-table', 'children'),
-               Output('data-grid', 'rowData'), Output('data-grid', 'columnDefs')],
-              [Input('site-filter', 'value'), Input('equipment-filter', 'value'),
-               Input('part-filter', 'value'), Input('risk-filter', 'value')])
-def update_dashboard(site, equip, part, risk):
-    """Update map markers, KPI table, and AG Grid based on filter selections"""
-    # Apply filters to data
-    df = inventory_data.copy()
-    if site: df = df[df['plant_name'] == site]
-    if equip and 'equip_name' in df.columns: df = df[df['equip_name'] == equip]
-    if part: df = df[df['part_name'] == part]
-    if risk: df = df[df['risk_level'] == risk]
-    
-    # Build KPI table
-    if df.empty:
-        kpi = html.Div("No data", style={'textAlign': 'center', 'padding': '20px', 'color': DB_COLORS['dark']})
-    else:
-        kpis = df.groupby('plant_name').apply(lambda x: pd.Series({
-            'Sufficient Inventory': f"{(len(x[x['risk_level'] == 'Stocked']) / len(x) * 100):.1f}%",
-            'Low Inventory Risk': f"{(len(x[x['risk_level'] == 'Low Stock']) / len(x) * 100):.1f}%",
-            'Stockout Risk': f"{(len(x[x['risk_level'] == 'Out of Stock']) / len(x) * 100):.1f}%"
-        }), include_groups=False).reset_index()
-        
-        rows = [html.Tr([
-            html.Td(r['plant_name'], style={'padding': '10px', 'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 
-                'fontSize': '13px', 'color': 'red' if float(r['Stockout Risk'].rstrip('%')) > 0 else DB_COLORS['dark'], 
-                'fontWeight': '600' if float(r['Stockout Risk'].rstrip('%')) > 0 else 'normal'}),
-            html.Td(r['Sufficient Inventory'], style={'padding': '10px', 'textAlign': 'center', 
-                'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 'fontSize': '13px'}),
-            html.Td(r['Low Inventory Risk'], style={'padding': '10px', 'textAlign': 'center', 
-                'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 'fontSize': '13px'}),
-            html.Td(r['Stockout Risk'], style={'padding': '10px', 'textAlign': 'center', 
-                'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 'fontSize': '13px'})
-        ]) for _, r in kpis.iterrows()]
-        
-        kpi = html.Table([html.Thead(html.Tr([html.Th(h, style={'padding': '10px', 'textAlign': 'left' if i == 0 else 'center', 
-            'borderBottom': f'2px solid {DB_COLORS["dark"]}', 'fontWeight': '600', 'fontSize': '14px'})
-            for i, h in enumerate(['Site', 'Sufficient Inventory', 'Low Inventory Risk', 'Stockout Risk'])])), 
-            html.Tbody(rows)], style={'width': '100%', 'borderCollapse': 'collapse', 
-                                     'fontFamily': 'DM Sans, sans-serif', 'color': DB_COLORS['dark']})
-    
-    # Build map markers with tooltips
-    markers = []
-    if not df.empty:
-        # Aggregate risk by site (worst risk wins)
-        sr = df.groupby(['plant_id', 'plant_name', 'lat', 'lon']).agg(
-            risk_level=('risk_level', lambda x: 'Out of Stock' if 'Out of Stock' in x.values 
-                       else ('Low Stock' if 'Low Stock' in x.values else 'Stocked'))).reset_index()
-        
-        for _, r in sr.iterrows():
-            sdf = df[df['plant_id'] == r['plant_id']]
-            parts = []
-            for rl, rc in [('Stocked', 'green'), ('Low Stock', 'orange'), ('Out of Stock', 'red')]:
-                pl = ', '.join(sorted(sdf[sdf['risk_level'] == rl]['part_name'].unique()))
-                parts.append(html.Div([html.Span('✓ ' if rl == 'Stocked' else ('⚠ ' if rl == 'Low Stock' else '✗ '), 
-                    style={'color': rc, 'fontWeight': 'bold', 'fontSize': '14px'}),
-                    html.Span(f'{rl}: ', style={'fontWeight': '500'}),
-                    html.Span(pl or 'None', style={'fontSize': '11px', 'color': '#555', 'wordWrap': 'break-word'})
-                ], style={'marginBottom': '6px', 'wordWrap': 'break-word', 'overflowWrap': 'break-word'}))
-            
-            markers.append(dl.CircleMarker(id=f"marker-{r['plant_id']}-{r['risk_level']}",
-                center=[float(r['lat']), float(r['lon'])], radius=10, color=RISK_COLORS[r['risk_level']], 
-                fillColor=RISK_COLORS[r['risk_level']], fillOpacity=0.7, weight=2,
-                children=[dl.Tooltip(html.Div([html.Div(r['plant_name'], style={'fontWeight': 'bold', 'fontSize': '14px', 
-                    'marginBottom': '10px', 'paddingBottom': '8px', 'borderBottom': '2px solid #ccc', 'color': '#0B2026',
-                    'wordWrap': 'break-word', 'overflowWrap': 'break-word'}), *parts], style={'padding': '8px', 
-                    'minWidth': '350px', 'maxWidth': '450px', 'fontFamily': 'DM Sans, sans-serif', 'lineHeight': '1.4',
-                    'wordWrap': 'break-word', 'overflowWrap': 'break-word', 'whiteSpace': 'normal'}), 
-                    permanent=False, direction='auto')]))
+def sync_snapshot(n, version, center, viewport):
+    """Publish the snapshot version (which refreshes filter options and outputs) whenever a new snapshot is
+    published. The map is only moved to the first ready snapshot's center, or later when a refresh changes
+    the center the page was given, so refreshes do not pan away from where the user is looking"""
+    snap = snapshots.current()
+    if snap.version == version:
+        return no_update, no_update, no_update
+    shown = (viewport or {}).get('center') or center
+    move = not version or list(snap.map_center) != list(shown or [])
+    return (snap.version, {'center': snap.map_center, 'transition': 'panTo'} if move else no_update,
+            snapshot_poll_ms(snap))
+
+# Pure UI toggles run in the browser: no HTTP round trip and no worker slot while workers are busy with LLM calls
+AI_BUTTON_STYLE = {'padding': '12px 40px', 'border': 'none', 'borderRadius': '8px', 'fontSize': '16px',
+    'fontWeight': '500', 'fontFamily': 'DM Sans, sans-serif', 'display': 'block', 'margin': '0 auto'}
+
+app.clientside_callback(
+    """function(site, part) {
+        const enabled = Boolean(site && part);
+        return [!enabled, Object.assign({}, %s, {
+            backgroundColor: enabled ? '%s' : '#cccccc', color: enabled ? 'white' : '#666666',
+            cursor: enabled ? 'pointer' : 'not-allowed'})];
+    }""" % (json.dumps(AI_BUTTON_STYLE), DB_COLORS['primary']),
+    [Output('ai-allocation-button', 'disabled'), Output('ai-allocation-button', 'style')],
+    [Input('site-filter', 'value'), Input('part-filter', 'value')])
+
+app.clientside_callback(
+    """function(close, instructions) {
+        const triggered = dash_clientside.callback_context.triggered;
+        const shown = triggered.length && triggered[0].prop_id.split('.')[0] === 'instructions-button';
+        return {display: shown ? 'block' : 'none'};
+    }""",
+    Output('welcome-modal', 'style'),
+    [Input('welcome-modal-close-button', 'n_clicks'), Input('instructions-button', 'n_clicks')],
+    prevent_initial_call=True)
+
+app.clientside_callback(
+    """function(ai, accept, cancel) {
+        const triggered = dash_clientside.callback_context.triggered;
+        const open = triggered.length && triggered[0].prop_id.split('.')[0] === 'ai-allocation-button';
+        return open ? [{display: 'block'}, {display: 'block'}, {display: 'none'}]
+                    : [{display: 'none'}, {display: 'none'}, {display: 'block'}];
+    }""",
+    [Output('ai-modal', 'style'), Output('ai-loading', 'style', allow_duplicate=True),
+     Output('ai-response-content', 'style', allow_duplicate=True)],
+    [Input('ai-allocation-button', 'n_clicks'), Input('modal-accept-button', 'n_clicks'),
+     Input('modal-cancel-button', 'n_clicks')], prevent_initial_call=True)
+
+LOADING = html.Div("Loading inventory data...", style={'textAlign': 'center', 'padding': '20px', 'color': DB_COLORS['dark']})
+FILTER_INPUTS = [Input('site-filter', 'value'), Input('equipment-filter', 'value'), Input('part-filter', 'value'),
+                 Input('risk-filter', 'value'), Input('snapshot-version', 'data')]
+
+def cached_output(name, site, equip, part, risk, render):
+    """Render one dashboard output for the current data and filters, reusing the memoized value if any"""
+    # Filter the local snapshot or the warehouse (DASHBOARD_BACKEND)
+    filters = DashboardFilters(site, equip, part, risk)
+    result = backend.query(filters)
+    return dashboard_cache.get_or_compute(result.token, (name, filters), lambda: render(result))
+
+@app.callback([Output('map-markers', 'children'), Output('marker-keys', 'data')], FILTER_INPUTS,
+              [State('marker-keys', 'data')])
+def update_markers(site, equip, part, risk, version=None, client_keys=None):
+    """Map markers for the selected filters; only markers that changed are sent to the browser"""
+    if MAP_MARKER_MODE == 'geojson':
+        return no_update, no_update
+    with output_timer.time('map-markers'):
+        if not snapshots.ready:
+            return [], []
+        markers, keys = cached_output('markers', site, equip, part, risk, render_markers)
+        return patch_markers(client_keys, keys, markers), keys
+
+if MAP_MARKER_MODE == 'geojson':
+    @app.callback([Output('site-layer', 'data'), Output('site-layer', 'hideout')], FILTER_INPUTS)
+    def update_site_layer(site, equip, part, risk, version=None):
+        """All sites as one geobuf layer; the hideout tells assets/site_layer.js where to fetch tooltips"""
+        with output_timer.time('site-layer'):
+            if not snapshots.ready:
+                return no_update, no_update
+            data = cached_output('site-layer', site, equip, part, risk, lambda result: site_geobuf(result.sites()))
+            filters = {k: v for k, v in zip(['site', 'equip', 'part', 'risk'], [site, equip, part, risk]) if v is not None}
+            return data, {'colors': RISK_COLORS, 'filters': filters, 'tooltip_url': app.get_relative_path('/map/site-tooltip')}
+
+@app.callback(Output('kpi-table', 'children'), FILTER_INPUTS)
+def update_kpis(site, equip, part, risk, version=None):
+    """KPI table for the selected filters"""
+    with output_timer.time('kpi-table'):
+        if not snapshots.ready:
+            return LOADING
+        return cached_output('kpis', site, equip, part, risk, render_kpis)
+
+# Dropdown id and the column it filters
+FILTER_DROPDOWNS = [('site-filter', 'plant_name'), ('equipment-filter', 'equip_name'), ('part-filter', 'part_name'),
+                    ('risk-filter', 'risk_level')]
+
+@app.callback([Output(dropdown, 'options') for dropdown, _ in FILTER_DROPDOWNS], FILTER_INPUTS)
+def update_filter_options(site, equip, part, risk, version=None):
+    """Faceted dropdowns: each lists only values that still have rows under the other filters, labelled with
+    the number of grid rows selecting it would show"""
+    with output_timer.time('filter-options'):
+        if not snapshots.ready:
+            return [no_update] * len(FILTER_DROPDOWNS)
+        facets = cached_output('facets', site, equip, part, risk, lambda result: result.facets())
+        snap = snapshots.current()
+        values = {'plant_name': snap.sites, 'equip_name': snap.equipment, 'part_name': snap.parts,
+                  'risk_level': risk_levels}
+        selected = {'plant_name': site, 'equip_name': equip, 'part_name': part, 'risk_level': risk}
+        return [facet_options(values[c], facets.get(c), selected[c]) for _, c in FILTER_DROPDOWNS]
+
+def facet_options(values, counts, selected):
+    """Options for the values that have rows (and the current selection), labelled with their grid row counts"""
+    if counts is None:
+        return [{'label': v, 'value': v} for v in values]
+    return [{'label': f"{v} ({counts.get(v, 0):,})", 'value': v} for v in values if v in counts or v == selected]
+
+# Grid rows go straight to the grid, or (columnar) through a store that assets/wire.js decodes into it
+GRID_ROWS_PROP = 'getRowsResponse' if GRID_ROW_MODEL == 'infinite' else 'rowData'
+GRID_ROWS_OUTPUT = Output('grid-payload', 'data') if GRID_WIRE_FORMAT == 'columnar' else Output('data-grid', GRID_ROWS_PROP)
+
+@app.callback(Output('data-grid', 'rowData') if GRID_ROW_MODEL == 'infinite' else GRID_ROWS_OUTPUT, FILTER_INPUTS)
+def update_grid(site, equip, part, risk, version=None):
+    """Grid rows for the selected filters (the infinite row model fetches its own blocks via grid_rows)"""
+    if GRID_ROW_MODEL == 'infinite':
+        return no_update
+    with output_timer.time('data-grid.rowData'):
+        if not snapshots.ready:
+            return []
+        encode = encode_columns if GRID_WIRE_FORMAT == 'columnar' else lambda gdf: gdf.to_dict('records')
+        return cached_output('grid', site, equip, part, risk, lambda result: encode(result.grid()))
+
+@app.callback(Output('data-grid', 'columnDefs'), [Input('snapshot-version', 'data')], [State('data-grid', 'columnDefs')])
+def update_column_defs(version, current):
+    """Grid column definitions; only sent when the snapshot's schema differs from what the browser has"""
+    with output_timer.time('data-grid.columnDefs'):
+        if not snapshots.ready:
+            return no_update
+        cdefs = column_defs(tuple(backend.columns()))
+        return no_update if cdefs == current else cdefs
+
+def render_markers(result):
+    """(markers, content keys) with worst risk per site; one grouped pass for the tooltip part lists"""
+    return marker_builder.build(result.sites(), result.site_parts()) if not result.empty else ([], [])
+
+def render_kpis(result):
+    """KPI table for one backend result"""
+    if result.empty:
+        return html.Div("No data", style={'textAlign': 'center', 'padding': '20px', 'color': DB_COLORS['dark']})
+    kpis = result.kpis()
     
-    # Build AG Grid data
-    gdf = df.copy()
-    if 'work_order_id' in gdf.columns:
-        gdf = gdf.drop_duplicates(subset=['plant_name', 'part_name', 'equip_name', 'work_order_id'], keep='first')
-    gdf['risk_sort'] = gdf['risk_level'].map(RISK_PRIORITY)
-    gdf = gdf.sort_values('risk_sort')
+    rows = [html.Tr([
+        html.Td(r['plant_name'], style={'padding': '10px', 'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 
+            'fontSize': '13px', 'color': 'red' if r['Stockout Risk'] > 0 else DB_COLORS['dark'], 
+            'fontWeight': '600' if r['Stockout Risk'] > 0 else 'normal'}),
+        html.Td(f"{r['Sufficient Inventory']:.1f}%", style={'padding': '10px', 'textAlign': 'center', 
+            'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 'fontSize': '13px'}),
+        html.Td(f"{r['Low Inventory Risk']:.1f}%", style={'padding': '10px', 'textAlign': 'center', 
+            'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 'fontSize': '13px'}),
+        html.Td(f"{r['Stockout Risk']:.1f}%", style={'padding': '10px', 'textAlign': 'center', 
+            'borderBottom': f'1px solid {DB_COLORS["light_gray"]}', 'fontSize': '13px'})
+    ]) for r in kpis.to_dict('records')]
     
-    cols = ['plant_name', 'part_name', 'equip_name', 'work_order_id', 'planned_date', 'required_part_quantity', 
-            'on_hand_stock', 'reserved_qty', 'projected_available_stock', 'safety_stock', 'shortage_quantity', 
-            'risk_level', 'criticality']
+    return html.Table([html.Thead(html.Tr([html.Th(h, style={'padding': '10px', 'textAlign': 'left' if i == 0 else 'center', 
+        'borderBottom': f'2px solid {DB_COLORS["dark"]}', 'fontWeight': '600', 'fontSize': '14px'})
+        for i, h in enumerate(['Site', 'Sufficient Inventory', 'Low Inventory Risk', 'Stockout Risk'])])), 
+        html.Tbody(rows)], style={'width': '100%', 'borderCollapse': 'collapse', 
+                                 'fontFamily': 'DM Sans, sans-serif', 'color': DB_COLORS['dark']})
+
+@lru_cache(maxsize=8)
+def column_defs(columns):
+    """AG Grid column definitions for a schema (tuple of column names), computed once per schema"""
     names = {'plant_name': 'Plant Name', 'part_name': 'Part Name', 'equip_name': 'Equipment Name', 
              'work_order_id': 'Work Order ID', 'planned_date': 'Planned Date', 'required_part_quantity': 'Required Quantity',
              'on_hand_stock': 'On Hand Stock', 'reserved_qty': 'Reserved Qty', 'projected_available_stock': 'Projected Stock',
@@ -219,83 +447,247 @@ def update_dashboard(site, equip, part, risk):
             'shortage_quantity': 'Gap between required and available', 'risk_level': 'Inventory status', 
             'criticality': 'Priority level'}
     
-    vc = [c for c in cols if c in gdf.columns and c != 'risk_sort']
-    cdefs = [{"field": c, "headerName": names.get(c, c), "headerTooltip": tips.get(c, names.get(c, c)),
+    vc = [c for c in GRID_COLUMNS if c in columns]
+    return [{"field": c, "headerName": names.get(c, c), "headerTooltip": tips.get(c, names.get(c, c)),
              "sortable": True, "filter": True} for c in vc]
-    
-    return markers, kpi, gdf.to_dict('records'), cdefs
 
-@app.callback([Output('ai-response-content', 'children'), Output('ai-response-content', 'style'),
-               Output('ai-loading', 'style')],
+@app.callback(GRID_ROWS_OUTPUT if GRID_ROW_MODEL == 'infinite' else Output('data-grid', 'getRowsResponse'),
+              [Input('data-grid', 'getRowsRequest')],
+              [State('site-filter', 'value'), State('equipment-filter', 'value'),
+               State('part-filter', 'value'), State('risk-filter', 'value')], prevent_initial_call=True)
+def grid_rows(row_request, site, equip, part, risk):
+    """Serve one block of grid rows (infinite row model) with the grid's sort and column filters applied"""
+    if not row_request or not snapshots.ready:
+        return {'rowData': [], 'rowCount': 0}
+    return grid_pager.page(backend.query(DashboardFilters(site, equip, part, risk)), row_request)
+
+if GRID_WIRE_FORMAT == 'columnar':
+    app.clientside_callback(ClientsideFunction('wire', 'decodeBlock' if GRID_ROW_MODEL == 'infinite' else 'decodeRows'),
+                            Output('data-grid', GRID_ROWS_PROP), [Input('grid-payload', 'data')], prevent_initial_call=True)
+
+# Refetch grid blocks when the dashboard filters or the snapshot change (infinite row model only)
+app.clientside_callback(
+    """function(site, equip, part, risk, version) {
+        if (window.dash_ag_grid) {
+            dash_ag_grid.getApiAsync('data-grid').then(api => {
+                if (api.getGridOption('rowModelType') === 'infinite') { api.purgeInfiniteCache(); }
+            });
+        }
+        return window.dash_clientside.no_update;
+    }""",
+    Output('data-grid', 'paginationGoTo'),
+    [Input('site-filter', 'value'), Input('equipment-filter', 'value'), Input('part-filter', 'value'),
+     Input('risk-filter', 'value'), Input('snapshot-version', 'data')], prevent_initial_call=True)
+
+AI_RESPONSE_STYLE = {'display': 'block', 'maxHeight': '400px', 'overflowY': 'auto', 'padding': '10px', 'marginBottom': '20px'}
+AI_LOADING_TEXT = 'Generating AI recommendations...'
+
+def recommendation_view(resp):
+    return html.Div([dcc.Markdown(resp, dangerously_allow_html=True, style={'color': DB_COLORS['dark'],
+        'fontFamily': 'DM Sans, sans-serif', 'lineHeight': '1.6'})
+    ], style={'width': '100%'}, className='markdown-content')
+
+def error_view(message):
+    return html.Div([html.P("Error:", style={'margin': '0 0 10px 0', 'color': '#d32f2f',
+        'fontFamily': 'DM Sans, sans-serif', 'fontWeight': '500'}),
+        html.P(message, style={'margin': '0', 'color': DB_COLORS['dark'], 'fontFamily': 'DM Sans, sans-serif',
+                               'whiteSpace': 'pre-wrap', 'lineHeight': '1.6'})])
+
+# content, content style, spinner style, job, poller disabled, spinner text
+AI_JOB_OUTPUTS = [Output('ai-response-content', 'children'), Output('ai-response-content', 'style'),
+                  Output('ai-loading', 'style'), Output('ai-job', 'data'), Output('ai-job-poller', 'disabled'),
+                  Output('ai-loading-status', 'children')]
+
+def ai_result(children):
+    """Outputs showing a finished recommendation (or error) and stopping the poller"""
+    return children, AI_RESPONSE_STYLE, {'display': 'none'}, None, True, AI_LOADING_TEXT
+
+@app.callback(AI_JOB_OUTPUTS,
               [Input('ai-allocation-button', 'n_clicks')],
               [State('part-filter', 'value'), State('site-filter', 'value'), State('equipment-filter', 'value'),
-               State('risk-filter', 'value'), State('data-grid', 'rowData')], prevent_initial_call=True)
-def generate_ai(n, part, site, equip, risk, grid):
-    """Generate AI recommendations for part allocation based on current filters and data"""
-    # Convert grid data to DataFrame
-    gdf = pd.DataFrame(grid) if grid else pd.DataFrame()
-    
-    # Get inventory data for the selected part across all sites
-    inv = inventory_data[inventory_data['part_name'] == part] if part else pd.DataFrame()
-    
-    # Format data as readable strings for LLM prompt
-    if not gdf.empty:
-        grid_str = gdf.to_string(index=False)
+               State('risk-filter', 'value'), State('data-grid', 'rowData'), State('ai-job', 'data')],
+              prevent_initial_call=True)
+def generate_ai(n, part, site, equip, risk, grid, previous_job=None):
+    """Start an AI recommendation for part allocation based on current filters and data.
+
+    Cached answers and local plans return at once; anything that calls the LLM runs as a
+    background job that poll_ai_job picks up, so this request thread is free again immediately.
+    """
+    # Convert grid data to DataFrame (the infinite row model only holds loaded blocks, so rebuild it)
+    if GRID_ROW_MODEL == 'infinite':
+        gdf = grid_pager.grid(backend.query(DashboardFilters(site, equip, part, risk))) if snapshots.ready else pd.DataFrame()
     else:
-        grid_str = "No grid data available"
+        gdf = pd.DataFrame(grid) if grid else pd.DataFrame()
     
-    if not inv.empty:
-        inv_str = inv.to_string(index=False)
-    else:
-        inv_str = "No inventory data available"
+    # Get inventory data for the selected part across all sites
+    inv = backend.part_rows(part) if part else pd.DataFrame()
     
-    # Build prompt with context data
     from datetime import datetime
     current_date = datetime.now().strftime("%B %d, %Y")
-    prompt = INVENTORY_RECOMMENDATION_PROMPT.format(grid_df=grid_str, inventory_data=inv_str, current_date=current_date)
     
     try:
-        resp = call_databricks_llm(prompt)
-        return html.Div([dcc.Markdown(resp, dangerously_allow_html=True, style={'color': DB_COLORS['dark'],
-            'fontFamily': 'DM Sans, sans-serif', 'lineHeight': '1.6'})
-        ], style={'width': '100%'}, className='markdown-content'), \
-            {'display': 'block', 'maxHeight': '400px', 'overflowY': 'auto', 'padding': '10px', 'marginBottom': '20px'}, \
-            {'display': 'none'}
+        # The key covers everything the answer depends on, including the rows themselves, so a hit is never stale
+        key = (part, site, equip, risk, frame_digest(gdf, inv), current_date, PROMPT_VERSION, LLM_ENDPOINT)
+        resp = recommendation_cache.get(key)
+        if resp is not None:
+            print(f"Recommendation for {part} at {site} served from cache")
+            return ai_result(recommendation_view(resp))
+        plan = None
+        if AI_RECOMMENDATION_MODE != 'llm':
+            # The plan takes milliseconds; only its narration needs the model, and only when action is required
+            plan = local_plan(part, site, gdf, inv)
+            if AI_RECOMMENDATION_MODE == 'engine' or not plan.action_required:
+                resp = plan.to_markdown()
+                recommendation_cache.put(key, resp)
+                return ai_result(recommendation_view(resp))
+        # Identical requests (same key) share one job
+        job = ai_jobs.submit('recommendation', run_recommendation, key, part, site, gdf, inv, current_date, plan,
+                             key=key)
+        print(f"Recommendation for {part} at {site} queued as job {job.id}")
+        return no_update, {'display': 'none'}, {'display': 'block'}, {'id': job.id}, False, AI_LOADING_TEXT
+    except QueueFull:
+        return ai_result(error_view("Too many recommendations are being generated right now. Please try again shortly."))
     except Exception as e:
-        return html.Div([html.P("Error:", style={'margin': '0 0 10px 0', 'color': '#d32f2f', 
-            'fontFamily': 'DM Sans, sans-serif', 'fontWeight': '500'}),
-            html.P(str(e), style={'margin': '0', 'color': DB_COLORS['dark'], 'fontFamily': 'DM Sans, sans-serif', 
-                                 'whiteSpace': 'pre-wrap', 'lineHeight': '1.6'})]), \
-            {'display': 'block', 'maxHeight': '400px', 'overflowY': 'auto', 'padding': '10px', 'marginBottom': '20px'}, \
-            {'display': 'none'}
+        return ai_result(error_view(str(e)))
+    finally:
+        # A new click replaces whatever this page was still waiting for. Released only after submit, so an
+        # identical click joins the running job; for that same job this just drops the page's earlier watch
+        if previous_job:
+            ai_jobs.cancel(previous_job.get('id'))
 
-@app.callback(
+def run_recommendation(job, key, part, site, gdf, inv, current_date, plan=None):
+    """Background job body: the recommendation markdown, cached unless the LLM call failed"""
+    def on_text(text):
+        # Rough progress from the share of the token limit written so far
+        job.update(0.3 + 0.65 * min(estimate_tokens(text) / LLM_MAX_TOKENS, 1.0), 'Writing recommendation', partial=text)
+    resp, complete = recommend(part, site, gdf, inv, current_date, plan, progress=job.update, on_text=on_text)
+    # Cached even if the job was cancelled meanwhile: the model call is already paid for
+    if complete:
+        recommendation_cache.put(key, resp)
+    return resp
+
+@app.callback([Output(o.component_id, o.component_property, allow_duplicate=True) for o in AI_JOB_OUTPUTS],
+              [Input('ai-job-poller', 'n_intervals')], [State('ai-job', 'data')], prevent_initial_call=True)
+def poll_ai_job(n, job_ref):
+    """Show the running job's progress, then its recommendation once it finishes"""
+    job = ai_jobs.get((job_ref or {}).get('id'))
+    if job is None:
+        return ai_result(error_view("The recommendation is no longer available. Please generate it again."))
+    if job.status == 'done':
+        return ai_result(recommendation_view(job.result))
+    if job.status == 'failed':
+        return ai_result(error_view(job.error))
+    if job.status == 'cancelled':
+        return no_update, no_update, no_update, None, True, AI_LOADING_TEXT
+    if job.partial:
+        # Streaming: show the text so far in place of the spinner
+        return recommendation_view(job.partial), AI_RESPONSE_STYLE, {'display': 'none'}, no_update, no_update, no_update
+    return no_update, no_update, no_update, no_update, no_update, f"{job.message}..."
+
+@app.callback([Output('ai-job', 'data', allow_duplicate=True), Output('ai-job-poller', 'disabled', allow_duplicate=True)],
+              [Input('modal-cancel-button', 'n_clicks')], [State('ai-job', 'data')], prevent_initial_call=True)
+def cancel_ai_job(n, job_ref):
+    """Cancel the modal's running recommendation job when the user cancels the modal"""
+    if job_ref and ai_jobs.cancel(job_ref.get('id')):
+        print(f"Recommendation job {job_ref['id']} cancelled")
+    return None, True
+
+def timed_llm_call(name, prompt, on_text=None):
+    """The LLM's answer to prompt, with its latency logged and reported under llm:<name> at /admin/callback-timing.
+
+    With on_text and LLM_CALL_MODE = stream the answer is streamed and on_text(text so far) is called as
+    it grows; time to first token is reported under llm:<name>:first_token. If the endpoint fails before
+    the first token (e.g. it does not support streaming), the blocking call is used instead.
+    """
+    with output_timer.time(f'llm:{name}'):
+        started = time.perf_counter()
+        resp = None
+        if on_text is not None and LLM_CALL_MODE == 'stream':
+            resp = stream_llm(name, prompt, on_text, started)
+        if resp is None:
+            resp = call_databricks_llm(prompt, endpoint_name=LLM_ENDPOINT, max_tokens=LLM_MAX_TOKENS)
+    print(f"LLM {name} took {time.perf_counter() - started:.1f}s for ~{estimate_tokens(prompt)} prompt tokens")
+    return resp
+
+def stream_llm(name, prompt, on_text, started):
+    """Streamed answer for timed_llm_call, or None to fall back to the blocking call"""
+    chunks = []
+    stream = stream_databricks_llm(prompt, endpoint_name=LLM_ENDPOINT, max_tokens=LLM_MAX_TOKENS)
+    try:
+        while True:
+            try:
+                delta = next(stream, None)
+            except Exception as e:
+                if not chunks:
+                    print(f"LLM {name} streaming failed ({type(e).__name__}: {e}); using the blocking call")
+                    return None
+                # Report like call_databricks_llm so the partial answer is not taken for a complete one
+                return f"Error calling LLM: {e}"
+            if delta is None:
+                break
+            if not chunks:
+                output_timer.record(f'llm:{name}:first_token', (time.perf_counter() - started) * 1000)
+                print(f"LLM {name} first token after {time.perf_counter() - started:.1f}s")
+            chunks.append(delta)
+            on_text(''.join(chunks))
+    finally:
+        stream.close()
+    if not chunks:
+        print(f"LLM {name} stream was empty; using the blocking call")
+        return None
+    return ''.join(chunks)
+
+def llm_failed(resp):
+    # call_databricks_llm reports failures as text
+    return resp.startswith("Error calling LLM")
+
+def local_plan(part, site, gdf, inv):
+    """plan_allocation, with its size and duration logged"""
+    started = time.perf_counter()
+    plan = plan_allocation(part, site, gdf, inv)
+    print(f"Allocation plan for {part} at {site}: {len(plan.transfers)} transfers, {len(plan.orders)} orders "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return plan
+
+def recommend(part, site, gdf, inv, current_date, plan=None, progress=lambda fraction, message: None, on_text=None):
+    """(markdown, complete) for AI_RECOMMENDATION_MODE; complete is False when the LLM call failed.
+
+    plan is the local_plan if the caller already has it. progress(fraction, message) is called before
+    each step (Job.update in a background job), and on_text(markdown so far) as a streamed LLM answer grows.
+    """
+    if AI_RECOMMENDATION_MODE == 'llm':
+        progress(0.1, 'Preparing inventory data')
+        # Decision-relevant columns only, one row per site, within the token budget
+        context = build_prompt(INVENTORY_RECOMMENDATION_PROMPT, gdf, inv, site, part, PROMPT_TOKEN_BUDGET,
+                               current_date=current_date)
+        print(f"Recommendation prompt for {part} at {site}: {context.describe()}")
+        progress(0.3, 'Waiting for the AI model')
+        resp = timed_llm_call('recommendation', context.prompt, on_text)
+        return resp, not llm_failed(resp)
+    if plan is None:
+        progress(0.1, 'Planning transfers and vendor orders')
+        plan = local_plan(part, site, gdf, inv)
+    draft = plan.to_markdown()
+    if AI_RECOMMENDATION_MODE != 'narrate' or not plan.action_required:
+        return draft, True
+    prompt = ALLOCATION_NARRATION_PROMPT.format(current_date=current_date, plan=json.dumps(plan.to_dict(), default=str),
+                                                draft=draft)
+    print(f"Narration prompt for {part} at {site}: ~{estimate_tokens(prompt)} tokens ({len(prompt)} chars)")
+    progress(0.3, 'Waiting for the AI model to explain the plan')
+    narration = timed_llm_call('narration', prompt, on_text)
+    # The plan stands on its own if the narration fails
+    return (draft, False) if llm_failed(narration) else (narration, True)
+
+app.clientside_callback(
+    """function(openClicks, closeClicks, style) {
+        const triggered = dash_clientside.callback_context.triggered;
+        if (!triggered.length) { return style; }
+        const opening = triggered[0].prop_id.split('.')[0] === 'toggle-chat-panel' && style.right === '-500px';
+        return Object.assign({}, style, {right: opening ? '0' : '-500px'});
+    }""",
     Output('chat-panel', 'style'),
-    [Input('toggle-chat-panel', 'n_clicks'),
-     Input('close-chat-panel', 'n_clicks')],
-    [State('chat-panel', 'style')],
-    prevent_initial_call=True
-)
-def toggle_chat_panel(open_clicks, close_clicks, current_style):
-    """Toggle the embedded chat panel"""
-    ctx = callback_context
-    if not ctx.triggered:
-        return current_style
-    
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    new_style = current_style.copy()
-    
-    if button_id == 'toggle-chat-panel':
-        # Toggle open/closed
-        if new_style.get('right') == '-500px':
-            new_style['right'] = '0'
-        else:
-            new_style['right'] = '-500px'
-    elif button_id == 'close-chat-panel':
-        # Close
-        new_style['right'] = '-500px'
-    
-    return new_style
+    [Input('toggle-chat-panel', 'n_clicks'), Input('close-chat-panel', 'n_clicks')],
+    [State('chat-panel', 'style')], prevent_initial_call=True)
 
 @app.callback(
     [Output('chat-messages', 'children'),
@@ -0,0 +1,33 @@
+// Functional props of the clustered site layer (MAP_MARKER_MODE=geojson); hideout carries the
+// risk colors, the tooltip URL and the dashboard filters the layer was built for
+window.siteLayer = {
+    pointToLayer: function(feature, latlng, context) {
+        const color = context.hideout.colors[feature.properties.risk_level];
+        return L.circleMarker(latlng, {radius: 10, color: color, fillColor: color, fillOpacity: 0.7, weight: 2});
+    },
+    clusterToLayer: function(feature, latlng, index, context) {
+        // Color a cluster by the worst risk among its sites
+        const leaves = index.getLeaves(feature.properties.cluster_id, Infinity);
+        const worst = leaves.reduce((w, leaf) => leaf.properties.rank < w.properties.rank ? leaf : w);
+        const color = context.hideout.colors[worst.properties.risk_level];
+        const count = feature.properties.point_count;
+        const icon = L.divIcon({className: '', iconSize: L.point(36, 36), html:
+            `<div style="width:36px;height:36px;border-radius:18px;background:${color};opacity:0.85;color:white;` +
+            `font:600 13px 'DM Sans', sans-serif;display:flex;align-items:center;justify-content:center;` +
+            `border:2px solid white">${count}</div>`});
+        return L.marker(latlng, {icon: icon});
+    },
+    onEachFeature: function(feature, layer, context) {
+        if (feature.properties.cluster) { return; }
+        // Part lists are only fetched the first time a site's tooltip opens
+        layer.bindTooltip('Loading...', {direction: 'auto'});
+        layer.once('tooltipopen', function() {
+            const params = new URLSearchParams(Object.assign({plant_id: feature.properties.plant_id},
+                                                             context.hideout.filters));
+            fetch(context.hideout.tooltip_url + '?' + params)
+                .then(response => response.ok ? response.text() : Promise.reject(response.status))
+                .then(html => layer.setTooltipContent(html))
+                .catch(() => layer.setTooltipContent(feature.properties.plant_name));
+        });
+    }
+};
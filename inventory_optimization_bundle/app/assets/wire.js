@@ -0,0 +1,25 @@
+// Decoders for the columnar grid payloads built by wire.py
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.wire = {
+    decodeRows: function(payload) {
+        if (!payload) { return window.dash_clientside.no_update; }
+        if (Array.isArray(payload)) { return payload; }  // already row dicts
+        const names = Object.keys(payload.columns);
+        const rows = new Array(payload.n);
+        for (let i = 0; i < payload.n; i++) { rows[i] = {}; }
+        names.forEach(name => {
+            const col = payload.columns[name];
+            if (Array.isArray(col)) {
+                for (let i = 0; i < payload.n; i++) { rows[i][name] = col[i]; }
+            } else {
+                const values = col.dict, codes = col.codes;
+                for (let i = 0; i < payload.n; i++) { rows[i][name] = codes[i] < 0 ? null : values[codes[i]]; }
+            }
+        });
+        return rows;
+    },
+    decodeBlock: function(payload) {
+        if (!payload) { return window.dash_clientside.no_update; }
+        return {rowData: window.dash_clientside.wire.decodeRows(payload.rowData), rowCount: payload.rowCount};
+    }
+};
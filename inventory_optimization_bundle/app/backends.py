@@ -0,0 +1,237 @@
+"""Dashboard data backends: in-memory snapshot or warehouse SQL, behind one interface"""
+import time
+from dataclasses import dataclass, replace
+from functools import cached_property
+import pandas as pd
+from inventory_store import RISK_PRIORITY, RISK_LEVELS, GRID_DEDUPE_KEY
+from kpis import risk_shares, share_table
+from memo import LRUCache
+from query import TableQuery
+from utils import get_table_version, read_sql
+
+# Columns shown in the AG Grid, in display order
+GRID_COLUMNS = ['plant_name', 'part_name', 'equip_name', 'work_order_id', 'planned_date', 'required_part_quantity',
+                'on_hand_stock', 'reserved_qty', 'projected_available_stock', 'safety_stock', 'shortage_quantity',
+                'risk_level', 'criticality']
+# Column filtered by each DashboardFilters field
+FILTER_FIELDS = {'plant_name': 'site', 'equip_name': 'equip', 'part_name': 'part', 'risk_level': 'risk'}
+
+
+@dataclass(frozen=True)
+class DashboardFilters:
+    """The four dashboard dropdown values (None = all)"""
+    site: str = None
+    equip: str = None
+    part: str = None
+    risk: str = None
+
+    def columns(self):
+        """Filter values keyed by the column they apply to"""
+        return {column: getattr(self, field) for column, field in FILTER_FIELDS.items()}
+
+    def without(self, column):
+        """These filters with the one on column cleared"""
+        return replace(self, **{FILTER_FIELDS[column]: None})
+
+
+class LocalResult:
+    """Dashboard data for one filter combination, computed from one in-memory snapshot.
+
+    KPIs, site markers and tooltips are summed from the snapshot's precomputed risk summary;
+    only the grid reads row-level data.
+    """
+
+    def __init__(self, snapshot, filters):
+        self.snapshot = snapshot
+        self.filters = filters
+        self.version = snapshot.version
+        self.token = snapshot.cache_token
+
+    @cached_property
+    def df(self):
+        return self.snapshot.store.select(**self.filters.columns())
+
+    @cached_property
+    def summary(self):
+        return self.snapshot.summary.select(**self.filters.columns())
+
+    @property
+    def empty(self):
+        # The summary has a row for every combination that has rows, so this never builds row-level data
+        return self.summary.empty
+
+    def kpis(self):
+        """Per plant risk shares (see kpis.share_table)"""
+        s = self.summary
+        return risk_shares(s['plant_name'], s['risk_level'], s['rows'])
+
+    def sites(self):
+        """One row per plant with location and worst risk level (risk_level is ordered worst first)"""
+        return self.summary.groupby(['plant_id', 'plant_name', 'lat', 'lon'], observed=True).agg(
+            risk_level=('risk_level', 'min')).reset_index()
+
+    def site_parts(self):
+        """(plant_id, risk_level, part_name) rows for the map tooltips"""
+        return self.summary[['plant_id', 'risk_level', 'part_name']]
+
+    def facets(self):
+        """{column: {value: grid rows}} per filter column, counting the grid rows (work order lines)
+        that match the other filters"""
+        return self.snapshot.summary.facets('grid_rows', **self.filters.columns())
+
+    def grid(self):
+        """Deduplicated grid rows sorted worst risk first, with a risk_sort column"""
+        gdf = self.df
+        if 'work_order_id' in gdf.columns:
+            gdf = gdf.drop_duplicates(subset=GRID_DEDUPE_KEY, keep='first')
+        gdf = gdf.assign(risk_sort=gdf['risk_level'].map(RISK_PRIORITY).astype('int8'))
+        return gdf.sort_values('risk_sort')
+
+
+class LocalBackend:
+    """Answers dashboard queries from the SnapshotManager's in-memory snapshot"""
+
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+
+    def query(self, filters):
+        return LocalResult(self.snapshots.current(), filters)
+
+    def columns(self):
+        """Columns of the row-level data"""
+        return self.snapshots.current().store.columns
+
+    def part_rows(self, part):
+        """All rows for one part across sites"""
+        return self.snapshots.current().store.select(part_name=part)
+
+
+_RISK_RANK_SQL = "CASE risk_level " + " ".join(
+    f"WHEN '{level}' THEN {rank}" for level, rank in RISK_PRIORITY.items()) + " END"
+
+
+class WarehouseResult:
+    """Dashboard data for one filter combination, answered by aggregate SQL on the warehouse"""
+
+    def __init__(self, backend, filters, version):
+        self.backend = backend
+        self.filters = filters
+        self.version = version
+        self.token = f"table-{version}"
+
+    @property
+    def empty(self):
+        return self._counts().empty
+
+    def _run(self, name, build):
+        key = (name, self.filters, self.version)
+        result = self.backend.cache.get(key)
+        if result is None:
+            query = self.backend.base_query
+            for column, value in self.filters.columns().items():
+                if value is not None:
+                    query = query.where(column, '=', value)
+            where, params = query.where_clause()
+            result = self.backend.run(build(where), params)
+            self.backend.cache.put(key, result)
+        return result
+
+    def _counts(self):
+        sums = ", ".join(f"SUM(CASE WHEN risk_level = '{level}' THEN 1 ELSE 0 END) AS `{level}`"
+                         for level in RISK_LEVELS)
+        return self._run('kpi', lambda where: f"SELECT plant_name, {sums}, COUNT(*) AS total "
+                                              f"FROM {self.backend.table_name}{where} GROUP BY plant_name ORDER BY plant_name")
+
+    def kpis(self):
+        counts = self._counts().dropna(subset=['plant_name'])
+        return share_table(counts['plant_name'], counts[RISK_LEVELS], counts['total'])
+
+    def sites(self):
+        df = self._run('sites', lambda where: f"SELECT plant_id, plant_name, lat, lon, MIN({_RISK_RANK_SQL}) AS risk_rank "
+                                              f"FROM {self.backend.table_name}{where} GROUP BY plant_id, plant_name, lat, lon")
+        levels = {rank: level for level, rank in RISK_PRIORITY.items()}
+        return df.assign(risk_level=df['risk_rank'].map(levels)).drop(columns=['risk_rank'])
+
+    def site_parts(self):
+        return self._run('site_parts', lambda where: f"SELECT DISTINCT plant_id, risk_level, part_name "
+                                                     f"FROM {self.backend.table_name}{where}")
+
+    def facets(self):
+        facets = {}
+        for column in FILTER_FIELDS:
+            if column not in self.backend.columns():
+                continue
+            others = WarehouseResult(self.backend, self.filters.without(column), self.version)
+            # Counted after the same de-duplication as grid(), so the numbers match what the grid shows
+            partition = ', '.join(GRID_DEDUPE_KEY)
+            df = others._run(f'facet-{column}', lambda where: f"SELECT {column} AS value, COUNT(*) AS n FROM "
+                                                              f"(SELECT * FROM {self.backend.table_name}{where} "
+                                                              f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition} "
+                                                              f"ORDER BY plant_id) = 1) GROUP BY {column}")
+            facets[column] = {v: int(n) for v, n in zip(df['value'], df['n']) if pd.notna(v) and n}
+        return facets
+
+    def grid(self):
+        partition = ', '.join(GRID_DEDUPE_KEY)
+        return self._run('grid', lambda where: f"SELECT *, {_RISK_RANK_SQL} AS risk_sort FROM {self.backend.table_name}{where} "
+                                               f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY plant_id) = 1 "
+                                               f"ORDER BY risk_sort LIMIT {int(self.backend.grid_limit)}")
+
+
+class WarehouseBackend:
+    """Answers dashboard queries with parameterized aggregate SQL for tables too large to hold in memory.
+
+    Results are cached per (query, filters, table version); the Delta version is re-read at most
+    every version_ttl seconds, and tables without history fall back to time buckets of that length.
+    """
+
+    def __init__(self, table_name, connect, where=(), cache_size=256, grid_limit=10000, version_ttl=60):
+        self.table_name = table_name
+        self.connect = connect
+        self.base_query = TableQuery(table_name)
+        for column, op, *value in where or ():
+            self.base_query = self.base_query.where(column, op, *value)
+        self.cache = LRUCache(cache_size)
+        self.grid_limit = grid_limit
+        self.version_ttl = version_ttl
+        self._version = (None, 0.0)
+
+    def run(self, sql, params):
+        started = time.time()
+        with self.connect() as conn:
+            df = read_sql(sql, conn, params)
+        print(f"Warehouse query returned {len(df)} rows in {time.time() - started:.2f}s")
+        return df
+
+    def version(self):
+        value, checked = self._version
+        if time.time() - checked < self.version_ttl:
+            return value
+        try:
+            with self.connect() as conn:
+                value = get_table_version(self.table_name, conn)
+        except Exception:
+            value = f"t{int(time.time() // self.version_ttl)}"
+        self._version = (value, time.time())
+        return value
+
+    def query(self, filters):
+        return WarehouseResult(self, filters, self.version())
+
+    def columns(self):
+        """Columns of the table, read once per table version"""
+        key = ('columns', self.version())
+        columns = self.cache.get(key)
+        if columns is None:
+            columns = list(self.run(f"SELECT * FROM {self.table_name} LIMIT 0", None).columns)
+            self.cache.put(key, columns)
+        return columns
+
+    def part_rows(self, part):
+        query = self.base_query.where('part_name', '=', part)
+        key = ('part_rows', part, self.version())
+        result = self.cache.get(key)
+        if result is None:
+            result = self.run(*query.to_sql())
+            self.cache.put(key, result)
+        return result
@@ -0,0 +1,102 @@
+"""Inverted index from filter values to row positions"""
+from functools import reduce
+import numpy as np
+import pandas as pd
+
+# The dashboard dropdowns; indexed on every snapshot
+FILTER_COLUMNS = ['plant_name', 'equip_name', 'part_name', 'risk_level']
+
+
+def intersect(*positions):
+    """Intersect sorted, unique position arrays, smallest first (keeps the result sorted)"""
+    positions = sorted(positions, key=len)
+    # kind='table' marks b in a bitmap, so each step is linear instead of sort-based
+    return reduce(lambda a, b: a[np.isin(a, b, assume_unique=True, kind='table')] if len(a) else a,
+                  positions[1:], positions[0])
+
+
+class FilterIndex:
+    """Posting lists (sorted row positions) per value of each indexed column.
+
+    Each equality column costs one position array the length of the frame plus one offset per
+    distinct value: rows are grouped by value with a stable argsort, so every posting list is an
+    ascending slice. `positions()` intersects the posting lists of the requested values, so
+    filtering costs time proportional to the posting lists involved rather than the table size.
+
+    The per-row category codes are kept as well, so `counts()` tallies the values of a column over
+    any set of positions with one bincount (dropdown facet counts).
+
+    Columns given as `ranges` (e.g. dates) keep a value-sorted order instead and answer
+    `between()`; combine those with `positions()` through `intersect()`.
+    """
+
+    def __init__(self, df, columns=FILTER_COLUMNS, ranges=()):
+        self.rows = len(df)
+        self._dtype = np.int32 if self.rows < 2 ** 31 else np.int64
+        self._postings = {}
+        self._ranges = {}
+        for column in columns:
+            if column in df.columns:
+                self._add_postings(column, df[column])
+        for column in ranges:
+            if column in df.columns:
+                self._add_range(column, df[column])
+
+    @property
+    def columns(self):
+        return list(self._postings)
+
+    def _add_postings(self, column, s):
+        cat = s.array if isinstance(s.dtype, pd.CategoricalDtype) else pd.Categorical(s)
+        codes = np.asarray(cat.codes)
+        order = np.argsort(codes, kind='stable').astype(self._dtype)
+        # Missing values (code -1) sort first and get bin 0; category i occupies bin i + 1
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes + 1, minlength=len(cat.categories) + 1))])
+        self._postings[column] = (pd.Index(cat.categories), order, offsets, codes)
+
+    def _add_range(self, column, s):
+        values = s.to_numpy()
+        valid = np.flatnonzero(s.notna().to_numpy())
+        order = valid[np.argsort(values[valid], kind='stable')].astype(self._dtype)
+        self._ranges[column] = (values[order], order)
+
+    def covers(self, columns):
+        return all(c in self._postings for c in columns)
+
+    def lookup(self, column, value):
+        """Sorted positions where column equals value; a list/tuple/set value matches any of its items"""
+        categories, order, offsets, _ = self._postings[column]
+        if isinstance(value, (list, tuple, set, frozenset)):
+            # Posting lists of distinct values are disjoint, so a sort of their union keeps it unique
+            parts = [self.lookup(column, v) for v in dict.fromkeys(value)]
+            return np.sort(np.concatenate(parts)) if parts else order[:0]
+        code = categories.get_indexer([value])[0]
+        if code < 0:
+            return order[:0]
+        return order[offsets[code + 1]:offsets[code + 2]]
+
+    def positions(self, **equals):
+        """Sorted positions matching every non-None column=value, or None when nothing is filtered"""
+        lists = [self.lookup(c, v) for c, v in equals.items() if v is not None]
+        return intersect(*lists) if lists else None
+
+    def counts(self, column, positions=None, weights=None):
+        """{value: count} of column over positions (all rows when None), summing weights if given; zeros omitted"""
+        categories, _, _, codes = self._postings[column]
+        codes = codes if positions is None else codes[positions]
+        if weights is not None and positions is not None:
+            weights = weights[positions]
+        totals = np.bincount(codes + 1, weights=weights, minlength=len(categories) + 1)[1:]
+        present = np.flatnonzero(totals)
+        return dict(zip(categories[present], totals[present].astype(np.int64).tolist()))
+
+    def between(self, column, low=None, high=None):
+        """Sorted positions with low <= column <= high (either bound may be None)"""
+        values, order = self._ranges[column]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        stop = len(values) if high is None else np.searchsorted(values, high, side='right')
+        return np.sort(order[start:stop])
+
+    def memory_usage(self):
+        return sum(o.nbytes + off.nbytes + c.nbytes for _, o, off, c in self._postings.values()) + \
+            sum(v.nbytes + o.nbytes for v, o in self._ranges.values())
@@ -0,0 +1,119 @@
+"""Server-side paging, sorting and column filtering for the AG Grid infinite row model"""
+import numpy as np
+import pandas as pd
+from memo import LRUCache
+
+_NUMBER_OPS = {'equals': np.equal, 'notEqual': np.not_equal, 'lessThan': np.less,
+               'lessThanOrEqual': np.less_equal, 'greaterThan': np.greater, 'greaterThanOrEqual': np.greater_equal}
+
+
+def _text_mask(s, cond):
+    op, value = cond.get('type', 'contains'), str(cond.get('filter') or '').lower()
+    if op in ('blank', 'notBlank'):
+        blank = s.isna() | (s.astype(str).str.strip() == '')
+        return blank if op == 'blank' else ~blank
+    text = s.astype(object).where(s.notna(), '').astype(str).str.lower()
+    masks = {'contains': lambda: text.str.contains(value, regex=False),
+             'notContains': lambda: ~text.str.contains(value, regex=False),
+             'equals': lambda: text == value, 'notEqual': lambda: text != value,
+             'startsWith': lambda: text.str.startswith(value), 'endsWith': lambda: text.str.endswith(value)}
+    if op not in masks:
+        raise ValueError(f"Unsupported text filter: {op}")
+    return masks[op]()
+
+
+def _compare_mask(s, cond, low, high):
+    op = cond.get('type', 'equals')
+    if op in ('blank', 'notBlank'):
+        return s.isna() if op == 'blank' else s.notna()
+    if op == 'inRange':
+        return (s >= low) & (s <= high)
+    if op not in _NUMBER_OPS:
+        raise ValueError(f"Unsupported filter: {op}")
+    return pd.Series(_NUMBER_OPS[op](s, low), index=s.index).fillna(False).astype(bool)
+
+
+def _condition_mask(s, cond):
+    kind = cond.get('filterType', 'text')
+    if 'conditions' in cond or 'condition1' in cond:
+        parts = cond.get('conditions') or [c for c in (cond.get('condition1'), cond.get('condition2')) if c]
+        masks = [_condition_mask(s, {'filterType': kind, **c}) for c in parts]
+        combine = np.logical_or if cond.get('operator', 'AND') == 'OR' else np.logical_and
+        return combine.reduce(masks) if masks else pd.Series(True, index=s.index)
+    if kind == 'number':
+        return _compare_mask(pd.to_numeric(s, errors='coerce'), cond, cond.get('filter'), cond.get('filterTo'))
+    if kind == 'date':
+        dates = pd.to_datetime(s, errors='coerce')
+        parse = lambda v: pd.Timestamp(v) if v else None
+        return _compare_mask(dates, cond, parse(cond.get('dateFrom')), parse(cond.get('dateTo')))
+    return _text_mask(s, cond)
+
+
+def apply_filter_model(df, filter_model):
+    """Rows of df matching an AG Grid filter model (text, number and date filters, AND/OR conditions)"""
+    mask = None
+    for column, cond in (filter_model or {}).items():
+        if column not in df.columns:
+            continue
+        m = np.asarray(_condition_mask(df[column], cond), dtype=bool)
+        mask = m if mask is None else mask & m
+    return df if mask is None else df[mask]
+
+
+def sort_positions(df, sort_model):
+    """Row positions of df in AG Grid sort-model order; only the sort key columns are copied"""
+    keys = [s for s in (sort_model or []) if s.get('colId') in df.columns]
+    if not keys:
+        return np.arange(len(df))
+    by = [s['colId'] for s in keys]
+    frame = df[by].reset_index(drop=True)
+    order = frame.sort_values(by, ascending=[s.get('sort', 'asc') == 'asc' for s in keys], kind='stable',
+                              na_position='last')
+    return order.index.to_numpy()
+
+
+class GridPager:
+    """Answers getRowsRequest blocks from the backend's grid rows.
+
+    The grid rows for each (data token, dashboard filters) and their filtered, sorted order for
+    each (column filters, sort) are computed once and kept in small LRUs, so scrolling through
+    pages only converts the requested block to dicts; rows the user never sees are never
+    materialized.
+    """
+
+    def __init__(self, columns, maxsize=8, encode=None):
+        self.columns = columns
+        self.encode = encode
+        self._grids = LRUCache(maxsize)
+        self._orders = LRUCache(maxsize)
+
+    def grid(self, result):
+        """result.grid(), computed once per data token and filter combination"""
+        key = (result.token, result.filters)
+        gdf = self._grids.get(key)
+        if gdf is None:
+            gdf = result.grid()
+            self._grids.put(key, gdf)
+        return gdf
+
+    def _ordered(self, result, filter_model, sort_model):
+        key = (result.token, result.filters, repr(filter_model), repr(sort_model))
+        cached = self._orders.get(key)
+        if cached is None:
+            gdf = apply_filter_model(self.grid(result), filter_model)
+            cached = (gdf, sort_positions(gdf, sort_model))
+            self._orders.put(key, cached)
+        return cached
+
+    def page(self, result, request):
+        """getRowsResponse dict ({'rowData', 'rowCount'}) for one getRowsRequest; rowData goes through encode if set"""
+        gdf, order = self._ordered(result, request.get('filterModel'), request.get('sortModel'))
+        start = max(int(request.get('startRow') or 0), 0)
+        end = max(int(request.get('endRow') or start), start)
+        block = gdf.iloc[order[start:end]]
+        cols = [c for c in self.columns if c in block.columns]
+        rows = self.encode(block[cols]) if self.encode else block[cols].to_dict('records')
+        return {'rowData': rows, 'rowCount': len(gdf)}
+
+    def metrics(self):
+        return {'grids': self._grids.metrics(), 'orders': self._orders.metrics()}
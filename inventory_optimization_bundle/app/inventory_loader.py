@@ -0,0 +1,131 @@
+"""Full and incremental loading of the gold inventory table into InventoryStores"""
+import resource
+import time
+import traceback
+import pandas as pd
+import pyarrow as pa
+from inventory_store import InventoryStore
+from utils import read_table, read_table_batches, get_table_version, read_table_changes
+
+# Rows are identified by this key when merging changes into a snapshot
+MERGE_KEY = ['plant_id', 'part_id', 'work_order_id', 'vendor_id']
+CDF_COLUMNS = ['_change_type', '_commit_version', '_commit_timestamp']
+
+
+class InventoryLoader:
+    """Callable loader for SnapshotManager.
+
+    mode='full'    always re-reads the whole table.
+    mode='version' (default) remembers the Delta table version: an unchanged version skips the
+                   reload entirely, a newer one reads the change data feed (table_changes) and
+                   merges it by MERGE_KEY. Tables without CDF fall back to a full reload.
+    mode='column'  remembers max(watermark_column) and fetches rows at or after it. Rows tying on the
+                   old maximum are fetched again so late ones are not missed; those whose key was already
+                   at that value in the snapshot are dropped, so an unchanged table skips the merge.
+                   Updates must advance the watermark, and deletes require a full reload.
+    Any failure in the incremental path falls back to a full reload.
+
+    Full loads stream `batch_size` rows at a time into the store (batch_size=0 fetches the whole
+    result in one piece) and log peak Arrow allocation and process RSS.
+
+    `connect()` returns a context manager yielding a SQL connection, e.g. ConnectionPool.connection.
+
+    `columns` and `where` ((column, op, value) predicates) are pushed down to every query, so a
+    deployment can load only the columns it renders or only its own sites. The merge key and
+    watermark column are always selected. `distinct=True` loads each projected row once, e.g. just
+    the dimension columns a deployment needs for its filter options.
+    """
+
+    def __init__(self, table_name, connect, mode='version', watermark_column=None, key=MERGE_KEY,
+                 batch_size=100_000, columns=None, where=(), distinct=False):
+        if mode == 'column' and not watermark_column:
+            raise ValueError("mode='column' requires watermark_column")
+        self.table_name = table_name
+        self.connect = connect
+        self.mode = mode
+        self.watermark_column = watermark_column
+        self.key = key
+        self.batch_size = batch_size
+        self.where = list(where or ())
+        self.distinct = distinct
+        self.columns = None
+        if columns:
+            required = list(key) + ([watermark_column] if watermark_column else [])
+            self.columns = list(dict.fromkeys(list(columns) + required))
+
+    def __call__(self, previous=None):
+        """Return a new store, or `previous` itself when the table has not changed"""
+        if self.mode != 'full' and previous is not None and previous.watermark is not None:
+            try:
+                return self.load_changes(previous)
+            except Exception as e:
+                print(f"Incremental load failed ({type(e).__name__}: {e}); falling back to full reload")
+                traceback.print_exc()
+        return self.load_full()
+
+    def load_full(self):
+        with self.connect() as conn:
+            watermark = self._current_version(conn) if self.mode == 'version' else None
+            print(f"Attempting to load data from: {self.table_name}")
+            if self.batch_size > 0:
+                batches = read_table_batches(self.table_name, conn, self.batch_size, self.columns, self.where,
+                                             self.distinct)
+                store = InventoryStore.from_arrow_batches(self._tracked(batches))
+            else:
+                store = InventoryStore(read_table(self.table_name, conn, self.columns, self.where, self.distinct))
+            print(f"Successfully loaded {len(store)} rows")
+            print(f"Columns: {store.columns}")
+            if self.mode == 'column' and not store.empty:
+                watermark = store.frame[self.watermark_column].max()
+            store.watermark = watermark
+            return store
+
+    def _tracked(self, batches):
+        """Pass batches through while logging count and peak memory"""
+        rows = count = peak_arrow = 0
+        for batch in batches:
+            rows += batch.num_rows
+            count += 1
+            peak_arrow = max(peak_arrow, pa.total_allocated_bytes())
+            yield batch
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Streamed {rows} rows in {count} batches of <= {self.batch_size}; "
+              f"peak Arrow memory {peak_arrow / 1024 ** 2:.1f} MB, peak RSS {rss_mb:.0f} MB")
+
+    def load_changes(self, previous):
+        with self.connect() as conn:
+            started = time.time()
+            if self.mode == 'version':
+                version = get_table_version(self.table_name, conn)
+                if version == previous.watermark:
+                    return previous
+                columns = self.columns + CDF_COLUMNS if self.columns else None
+                changes = read_table_changes(self.table_name, conn, previous.watermark + 1, columns, self.where)
+                changes = changes[changes['_change_type'] != 'update_preimage']
+                changes = changes.sort_values('_commit_version', kind='stable')
+                latest = changes.drop_duplicates(subset=self.key, keep='last')
+                deleted = latest[latest['_change_type'] == 'delete']
+                upserts = latest[latest['_change_type'] != 'delete'].drop(columns=CDF_COLUMNS)
+            else:
+                version = previous.watermark
+                upserts = read_table(self.table_name, conn, self.columns,
+                                     self.where + [(self.watermark_column, '>=', previous.watermark)])
+                # Rows tying on the old watermark that the snapshot already holds at it were merged before
+                seen = previous.frame[self.watermark_column] == previous.watermark
+                upserts = upserts[~((upserts[self.watermark_column] == previous.watermark).to_numpy()
+                                    & previous.has_keys(upserts, self.key, seen))]
+                if upserts.empty:
+                    return previous
+                version = max(version, upserts[self.watermark_column].max())
+                deleted = pd.DataFrame(columns=self.key)
+            store = previous.merge(upserts, deleted, self.key, watermark=version)
+            print(f"Merged {len(upserts)} changed and {len(deleted)} deleted rows "
+                  f"(watermark {previous.watermark} -> {version}) in {time.time() - started:.1f}s")
+            return store
+
+    def _current_version(self, conn):
+        try:
+            return get_table_version(self.table_name, conn)
+        except Exception as e:
+            print(f"Could not read table version ({type(e).__name__}: {e}); incremental loads disabled")
+            return None
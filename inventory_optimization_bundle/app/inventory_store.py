@@ -0,0 +1,228 @@
+"""In-memory columnar store for the inventory snapshot"""
+import warnings
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from filter_index import FilterIndex, FILTER_COLUMNS
+
+RISK_PRIORITY = {'Out of Stock': 1, 'Low Stock': 2, 'Stocked': 3}
+RISK_LEVELS = sorted(RISK_PRIORITY, key=RISK_PRIORITY.get)
+
+# Grain of the per-snapshot risk summary: every dashboard filter plus what the map needs
+SUMMARY_KEYS = ['plant_id', 'plant_name', 'lat', 'lon', 'part_name', 'equip_name', 'risk_level']
+# One dashboard grid row per work order line; other rows for it (e.g. one per vendor) are dropped
+GRID_DEDUPE_KEY = ['plant_name', 'part_name', 'equip_name', 'work_order_id']
+
+# String columns whose distinct/total ratio is below this are dictionary-encoded
+CATEGORY_RATIO = 0.5
+
+
+def _compact_column(s):
+    """Return a memory-compact version of a single column"""
+    if s.name == 'risk_level':
+        return s.astype(pd.CategoricalDtype(RISK_LEVELS, ordered=True))
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Keep categories sorted so groupby output is alphabetical, as it is for plain strings
+        s = s.cat.remove_unused_categories()
+        if not s.cat.ordered and not s.cat.categories.is_monotonic_increasing:
+            s = s.cat.reorder_categories(s.cat.categories.sort_values())
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        return pd.to_numeric(s, downcast='integer')
+    if s.dtype != object:
+        return s
+    sample = s.dropna()
+    if sample.empty:
+        return s
+    first = sample.iloc[0]
+    if isinstance(first, Decimal):
+        return s.astype('float64')
+    if isinstance(first, str) and s.nunique(dropna=True) <= CATEGORY_RATIO * len(s):
+        return s.astype('category')
+    return s
+
+
+def _compact_batch(batch, encode):
+    """Dictionary-encode the chosen string columns and turn DECIMAL columns into float64"""
+    columns = []
+    for name, col in zip(batch.column_names, batch.columns):
+        if name in encode:
+            col = pc.dictionary_encode(col)
+        elif pa.types.is_decimal(col.type):
+            # Going through the decimal text gives the same nearest double as float(Decimal)
+            col = col.cast(pa.string()).cast(pa.float64())
+        columns.append(col)
+    return pa.table(columns, names=batch.column_names)
+
+
+def _key_column(s):
+    """Canonical form of a key column: numbers as nullable Float64, so an id read as int64 (no NULLs in a
+    change set) and as float64 (LEFT JOIN NULLs in the snapshot) hash the same; anything else as objects"""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(s.cat.categories.dtype)
+    if s.dtype == object:
+        values = s.dropna()
+        if len(values) and values.map(lambda v: isinstance(v, (int, float, Decimal, np.number))
+                                      and not isinstance(v, bool)).all():
+            s = pd.to_numeric(s, errors='coerce')
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return pd.to_numeric(s, errors='coerce').astype('Float64')
+    return s.astype(object)
+
+
+def _key_hash(df, key):
+    """One uint64 per row identifying its key values, whatever dtype each side read them as"""
+    return pd.util.hash_pandas_object(pd.DataFrame({c: _key_column(df[c]) for c in key}), index=False).to_numpy()
+
+
+class InventoryStore:
+    """Immutable snapshot of the gold inventory table.
+
+    Repeated strings (plant, part, equipment, risk level, ...) are stored as categoricals,
+    integers are downcast and DECIMAL columns become floats. `frame` and `select()` hand out the
+    snapshot's own frame or views of it without copying; callers must not modify them in place.
+    The app enables pandas copy-on-write at startup (app.py), which makes that safe.
+
+    `build_index()` adds a FilterIndex, after which `select()` on indexed columns intersects
+    posting lists instead of scanning every row.
+    """
+
+    def __init__(self, df, watermark=None):
+        df = df.reset_index(drop=True)
+        self._df = pd.DataFrame({c: _compact_column(df[c]) for c in df.columns}, index=df.index)
+        self.watermark = watermark
+        self.index = None
+
+    @property
+    def frame(self):
+        """Read-only view of the full snapshot"""
+        return self._df
+
+    @property
+    def columns(self):
+        return list(self._df.columns)
+
+    @property
+    def empty(self):
+        return self._df.empty
+
+    def __len__(self):
+        return len(self._df)
+
+    def build_index(self, columns=FILTER_COLUMNS, ranges=()):
+        """Index the given columns for select(); returns the store"""
+        self.index = FilterIndex(self._df, columns, ranges)
+        return self
+
+    def select(self, **equals):
+        """Rows where each given column equals its value (or any value of a list); None values and
+        missing columns are ignored"""
+        equals = {c: v for c, v in equals.items() if v is not None and c in self._df.columns}
+        if not equals:
+            return self._df
+        if self.index is not None and self.index.covers(equals):
+            return self._df.take(self.index.positions(**equals))
+        mask = None
+        for col, value in equals.items():
+            m = self._df[col].isin(value) if isinstance(value, (list, tuple, set, frozenset)) else self._df[col] == value
+            mask = m if mask is None else mask & m
+        return self._df[mask]
+
+    def facets(self, weight=None, **equals):
+        """{column: {value: count}} for each given column present: the rows (or the sum of weight) matching
+        every *other* non-None filter, so a dropdown can offer only values that still have data"""
+        equals = {c: v for c, v in equals.items() if c in self._df.columns}
+        weights = self._df[weight].to_numpy() if weight else None
+        facets = {}
+        for column in equals:
+            others = {c: v for c, v in equals.items() if c != column and v is not None}
+            if self.index is not None and self.index.covers(equals):
+                facets[column] = self.index.counts(column, self.index.positions(**others), weights)
+                continue
+            rows = self.select(**others)
+            counts = rows.groupby(column, observed=True)[weight].sum() if weight else rows[column].value_counts()
+            facets[column] = {k: int(v) for k, v in counts.items() if v}
+        return facets
+
+    def options(self, column):
+        """Sorted distinct non-empty values of a column, for filter dropdowns"""
+        if column not in self._df.columns:
+            return []
+        return sorted(v for v in self._df[column].dropna().unique() if v)
+
+    @classmethod
+    def from_arrow_batches(cls, batches, watermark=None):
+        """Build a store from an iterable of Arrow tables, compacting each one as it arrives.
+
+        Only the current raw batch and the already-compacted ones are held at any time, so peak
+        memory stays close to the final snapshot size instead of twice the raw result.
+        """
+        compacted, encode = [], None
+        for batch in batches:
+            if encode is None:
+                encode = {name for name, col in zip(batch.column_names, batch.columns)
+                          if (pa.types.is_string(col.type) or pa.types.is_large_string(col.type))
+                          and pc.count_distinct(col).as_py() <= CATEGORY_RATIO * batch.num_rows}
+            compacted.append(_compact_batch(batch, encode))
+            del batch
+        if not compacted:
+            return cls(pd.DataFrame(), watermark=watermark)
+        table = pa.concat_tables(compacted)
+        del compacted
+        # Convert column by column so each Arrow column is released as soon as it has been compacted
+        names, arrays = table.column_names, dict(zip(table.column_names, table.columns))
+        del table
+        frame = pd.DataFrame({name: _compact_column(arrays.pop(name).to_pandas().rename(name)) for name in names},
+                             copy=False)
+        store = cls.__new__(cls)
+        store._df, store.watermark, store.index = frame, watermark, None
+        return store
+
+    def merge(self, upserts, deleted_keys, key, watermark=None):
+        """New store with rows matching deleted_keys or upserts (by key columns) replaced by upserts"""
+        upserts = InventoryStore(upserts).frame
+        if set(upserts.columns) != set(self._df.columns):
+            raise ValueError("Changed rows do not match the snapshot schema")
+        replaced = [_key_hash(f, key) for f in (upserts, deleted_keys) if len(f)]
+        keep = ~np.isin(_key_hash(self._df, key), np.concatenate(replaced)) if replaced else slice(None)
+        with warnings.catch_warnings():
+            # All-NA columns in small change sets only affect the intermediate dtype; columns are re-encoded below
+            warnings.simplefilter('ignore', FutureWarning)
+            merged = pd.concat([f for f in (self._df[keep], upserts[self._df.columns]) if len(f)], ignore_index=True)
+        return InventoryStore(merged, watermark=watermark)
+
+    def has_keys(self, df, key, rows=None):
+        """Boolean array: whether each row of df has a key (by key columns) among the store's rows, or among
+        `rows` (a mask over the store) when given"""
+        own = self._df if rows is None else self._df[rows]
+        return np.isin(_key_hash(df, key), _key_hash(own, key)) if len(df) and len(own) else np.zeros(len(df), bool)
+
+    def risk_summary(self):
+        """Store of row counts ('rows') per SUMMARY_KEYS combination.
+
+        Dashboard filters are columns of the summary, so KPI shares and worst risk per site for any
+        filter combination can be summed from it instead of rescanning the row-level snapshot.
+        'grid_rows' counts the distinct GRID_DEDUPE_KEY values among them, i.e. the rows the grid
+        shows, for labels a user compares with the grid.
+        """
+        keys = [k for k in SUMMARY_KEYS if k in self._df.columns]
+        if self._df.empty or 'risk_level' not in keys:
+            return InventoryStore(pd.DataFrame(columns=keys + ['rows', 'grid_rows']))
+        counts = self._df.groupby(keys, observed=True, dropna=False, sort=False).size()
+        summary = counts.rename('rows').to_frame()
+        if set(GRID_DEDUPE_KEY) <= set(self._df.columns):
+            lines = self._df[list(dict.fromkeys(keys + GRID_DEDUPE_KEY))].drop_duplicates()
+            summary['grid_rows'] = lines.groupby(keys, observed=True, dropna=False, sort=False).size()
+        else:
+            summary['grid_rows'] = summary['rows']
+        return InventoryStore(summary.reset_index())
+
+    def memory_usage(self):
+        """Total bytes held by the snapshot, including string payloads and the filter index"""
+        index_bytes = self.index.memory_usage() if self.index is not None else 0
+        return int(self._df.memory_usage(deep=True).sum()) + index_bytes
+
+    def summary(self):
+        return f"{len(self._df)} rows, {len(self._df.columns)} columns, {self.memory_usage() / 1024 ** 2:.1f} MB"
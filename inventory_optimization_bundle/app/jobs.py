@@ -0,0 +1,143 @@
+"""Background jobs on a bounded thread pool, polled by id from Dash callbacks"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+ACTIVE = ('queued', 'running')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job by Job.update once the job has been cancelled"""
+
+
+class QueueFull(RuntimeError):
+    """Raised by JobQueue.submit when max_pending jobs are already queued or running"""
+
+
+@dataclass(eq=False)
+class Job:
+    id: str
+    name: str
+    key: object = None
+    status: str = 'queued'  # queued, running, done, failed or cancelled
+    progress: float = 0.0
+    message: str = 'Queued'
+    result: object = None
+    partial: object = None  # output so far, for jobs that produce it incrementally
+    error: str = None
+    created: float = field(default_factory=time.time)
+    finished: float = None
+    watchers: int = 1  # callers sharing this job; it is only cancelled once all of them cancel
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _future: object = field(default=None, repr=False)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def update(self, progress, message, partial=None):
+        """Report progress (and optionally the output so far) from inside the job; raises JobCancelled if
+        the job was cancelled meanwhile"""
+        if self.cancelled:
+            raise JobCancelled(self.id)
+        self.progress, self.message = progress, message
+        if partial is not None:
+            self.partial = partial
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'status': self.status, 'progress': round(self.progress, 2),
+                'message': self.message, 'error': self.error, 'age_s': round(time.time() - self.created, 1)}
+
+
+class JobQueue:
+    """Runs `fn(job, *args)` on a bounded thread pool so slow work (LLM calls) never holds a request thread.
+
+    Callers get a Job back at once and poll `get(job_id)` for its progress and result. Submitting with
+    a key already held by a queued or running job joins that job instead of starting a second one.
+    `cancel` drops a queued job outright; a running job stops at its next `Job.update`, and whatever
+    it was waiting on is discarded. Finished jobs are kept for `retention` seconds for late polls.
+    Jobs live in this process, like the snapshot, so polls must reach the worker that took the job.
+    """
+
+    def __init__(self, workers=4, max_pending=16, retention=600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.counts = {'submitted': 0, 'joined': 0, 'rejected': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished is not None and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, name, fn, *args, key=None):
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and job.status in ACTIVE and not job.cancelled:
+                        job.watchers += 1
+                        self.counts['joined'] += 1
+                        return job
+            if sum(j.status in ACTIVE for j in self._jobs.values()) >= self.max_pending:
+                self.counts['rejected'] += 1
+                raise QueueFull(f"{self.max_pending} jobs already queued or running")
+            job = Job(uuid.uuid4().hex, name, key)
+            self._jobs[job.id] = job
+            self.counts['submitted'] += 1
+            job._future = self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        if job.cancelled:  # cancelled just as a worker picked it up
+            self._finish(job, 'cancelled')
+            return
+        job.status, job.message = 'running', 'Starting'
+        try:
+            job.result = fn(job, *args)
+            status = 'cancelled' if job.cancelled else 'done'
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            traceback.print_exc()
+            job.error = f"{type(e).__name__}: {e}"
+            status = 'failed'
+        self._finish(job, status)
+
+    def _finish(self, job, status):
+        with self._lock:
+            job.status, job.finished = status, time.time()
+            if status == 'done':
+                job.progress = 1.0
+            self.counts[status] += 1
+
+    def get(self, job_id):
+        return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id):
+        """Cancel a job for one of its watchers; True once the job itself is cancelled"""
+        job = self.get(job_id)
+        if job is None or job.status not in ACTIVE:
+            return False
+        with self._lock:
+            job.watchers -= 1
+            if job.watchers > 0:
+                return False
+            job._cancel.set()
+            queued = job._future.cancel()
+        if queued:
+            self._finish(job, 'cancelled')
+        return True
+
+    def metrics(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {'workers': self.workers, 'max_pending': self.max_pending, **self.counts,
+                'queued': sum(j.status == 'queued' for j in jobs), 'running': sum(j.status == 'running' for j in jobs),
+                'jobs': [j.to_dict() for j in jobs if j.status in ACTIVE]}
@@ -0,0 +1,47 @@
+"""Vectorized risk KPIs: per-plant risk shares in one bincount pass"""
+import numpy as np
+import pandas as pd
+from inventory_store import RISK_LEVELS
+
+# KPI table column for each risk level's share
+KPI_LABELS = {'Stocked': 'Sufficient Inventory', 'Low Stock': 'Low Inventory Risk', 'Out of Stock': 'Stockout Risk'}
+
+
+def risk_counts(plant, risk, weights=None):
+    """Count rows per (plant, risk level) in a single np.bincount.
+
+    `plant` and `risk` are aligned Series (categorical or plain); `weights` optionally gives each
+    row a count, e.g. the 'rows' column of a risk summary. Returns (plant names, counts with one
+    column per RISK_LEVELS, totals). Totals include rows with a missing or unknown risk level,
+    and plants without rows or with a missing name are dropped.
+    """
+    plant = plant if isinstance(plant.dtype, pd.CategoricalDtype) else plant.astype('category')
+    names = plant.cat.categories
+    p = plant.cat.codes.to_numpy()
+    r = pd.Categorical(risk, categories=RISK_LEVELS).codes.astype(np.intp)
+    width = len(RISK_LEVELS) + 1  # last bin collects unknown risk levels
+    r[r < 0] = width - 1
+    valid = p >= 0
+    w = None if weights is None else np.asarray(weights, dtype='float64')[valid]
+    flat = np.bincount(p[valid].astype(np.intp) * width + r[valid], weights=w, minlength=len(names) * width)
+    matrix = flat.reshape(len(names), width)
+    totals = matrix.sum(axis=1)
+    seen = totals > 0
+    return names[seen], matrix[seen, :-1], totals[seen]
+
+
+def share_table(names, counts, totals):
+    """plant_name plus one percentage (0-100, numeric) column per KPI_LABELS entry"""
+    counts = np.asarray(counts, dtype='float64')
+    totals = np.asarray(totals, dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = counts / totals[:, None] * 100
+    out = pd.DataFrame({'plant_name': np.asarray(names, dtype=object)})
+    for level, label in KPI_LABELS.items():
+        out[label] = shares[:, RISK_LEVELS.index(level)]
+    return out
+
+
+def risk_shares(plant, risk, weights=None):
+    """Per-plant risk share table for aligned plant/risk Series (see risk_counts)"""
+    return share_table(*risk_counts(plant, risk, weights))
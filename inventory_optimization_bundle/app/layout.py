@@ -102,7 +102,14 @@ def create_filters(sites, equipment, parts, risk_levels):
         create_filter_dropdown("Risk Level:", 'risk-filter', risk_levels, "All Risk Levels")
     ], style=CONTAINER_STYLE)
 
-def create_map_and_kpi_row(initial_center):
+def create_site_layer():
+    """All sites as one clustered, geobuf-encoded GeoJSON layer (MAP_MARKER_MODE=geojson); see assets/site_layer.js"""
+    js = lambda name: {'variable': f'siteLayer.{name}'}
+    return dl.GeoJSON(id='site-layer', format='geobuf', cluster=True, zoomToBoundsOnClick=True,
+                      superClusterOptions={'radius': 60}, pointToLayer=js('pointToLayer'),
+                      clusterToLayer=js('clusterToLayer'), onEachFeature=js('onEachFeature'))
+
+def create_map_and_kpi_row(initial_center, marker_mode='markers'):
     return html.Div([
         html.Div([
             dl.Map(id='understock-map', center=initial_center, zoom=7.5, children=[
@@ -110,8 +117,10 @@ def create_map_and_kpi_row(initial_center):
                            attribution='Tiles &copy; Esri'),
                 dl.TileLayer(url="https://server.arcgisonline.com/ArcGIS/rest/services/Reference/World_Boundaries_and_Places/MapServer/tile/{z}/{y}/{x}",
                            attribution='Labels &copy; Esri'),
-                dl.LayerGroup(id='map-markers')
-            ], style={'height': '350px', 'border': f'2px solid {DB_COLORS["light_gray"]}', 'borderRadius': '8px'})
+                dl.LayerGroup(id='map-markers'),
+                *([create_site_layer()] if marker_mode == 'geojson' else [])
+            ], style={'height': '350px', 'border': f'2px solid {DB_COLORS["light_gray"]}', 'borderRadius': '8px'}),
+            dcc.Store(id='marker-keys')  # content keys of the markers on the map, for partial updates
         ], style={'flex': '1', 'backgroundColor': DB_COLORS['off_white'], 'padding': '20px', 'borderRadius': '8px', 
                  'border': f'2px solid {DB_COLORS["light_gray"]}', 'marginRight': '20px'}),
         html.Div([
@@ -125,19 +134,26 @@ def create_map_and_kpi_row(initial_center):
                  'border': f'2px solid {DB_COLORS["light_gray"]}', 'height': '350px', 'overflow': 'auto'})
     ], style={'display': 'flex', 'margin': '0 40px 20px 40px'})
 
-def create_data_table():
+def create_data_table(row_model='clientSide', block_size=100):
+    """Inventory grid; row_model='infinite' fetches sorted/filtered blocks of block_size rows from the server"""
+    options = {"pagination": True, "paginationPageSize": 20, "tooltipShowDelay": 500,
+        "getRowStyle": {"styleConditions": [
+            # Rows of the infinite model have no data until their block has loaded
+            {"condition": "params.data && params.data.risk_level == 'Stocked'", "style": {"backgroundColor": "#d4edda"}},
+            {"condition": "params.data && params.data.risk_level == 'Low Stock'", "style": {"backgroundColor": "#fff3cd"}},
+            {"condition": "params.data && params.data.risk_level == 'Out of Stock'", "style": {"backgroundColor": "#f8d7da"}}
+        ]}, "maintainColumnOrder": True}
+    grid_args = {'rowData': []}
+    if row_model == 'infinite':
+        options.update({"cacheBlockSize": block_size, "maxBlocksInCache": 10, "infiniteInitialRowCount": 1})
+        grid_args = {'rowModelType': 'infinite'}
     return html.Div([
         html.H3("Detailed Inventory Data", style={'marginTop': '0', 'marginBottom': '20px', 
                'color': DB_COLORS['dark'], 'fontWeight': '500', **FONT_STYLE}),
-        dag.AgGrid(id='data-grid', rowData=[], columnDefs=[],
+        dag.AgGrid(id='data-grid', columnDefs=[], **grid_args,
             defaultColDef={"resizable": True, "sortable": True, "filter": True, "tooltipComponent": "agTooltipComponent"},
-            dashGridOptions={"pagination": True, "paginationPageSize": 20, "tooltipShowDelay": 500,
-                "getRowStyle": {"styleConditions": [
-                    {"condition": "params.data.risk_level == 'Stocked'", "style": {"backgroundColor": "#d4edda"}},
-                    {"condition": "params.data.risk_level == 'Low Stock'", "style": {"backgroundColor": "#fff3cd"}},
-                    {"condition": "params.data.risk_level == 'Out of Stock'", "style": {"backgroundColor": "#f8d7da"}}
-                ]}, "maintainColumnOrder": True},
-            style={'height': '400px', **FONT_STYLE})
+            dashGridOptions=options, style={'height': '400px', **FONT_STYLE}),
+        dcc.Store(id='grid-payload')  # columnar grid rows (GRID_WIRE_FORMAT=columnar), decoded in the browser
     ], style=CONTAINER_STYLE)
 
 def create_ai_button():
@@ -301,11 +317,19 @@ def create_embedded_chat():
         'transition': 'right 0.3s ease-in-out'
     })
 
-def create_layout(sites, equipment, parts, risk_levels, initial_center):
+def create_snapshot_sync(snapshot_version, poll_ms):
+    """Hidden components that let open pages pick up refreshed inventory snapshots"""
+    return html.Div([
+        dcc.Store(id='snapshot-version', data=snapshot_version),
+        dcc.Interval(id='snapshot-poller', interval=poll_ms, n_intervals=0, disabled=poll_ms <= 0)
+    ], style={'display': 'none'})
+
+def create_layout(sites, equipment, parts, risk_levels, initial_center, snapshot_version=0, poll_ms=60000,
+                  grid_row_model='clientSide', grid_block_size=100, marker_mode='markers'):
     return html.Div([
         html.Link(rel='stylesheet', href='https://fonts.googleapis.com/css2?family=DM+Sans:wght@400;500;700&display=swap'),
         create_header(), create_filters(sites, equipment, parts, risk_levels),
-        create_map_and_kpi_row(initial_center), create_data_table(), create_ai_button(),
-        create_embedded_chat()
+        create_map_and_kpi_row(initial_center, marker_mode), create_data_table(grid_row_model, grid_block_size), create_ai_button(),
+        create_embedded_chat(), create_snapshot_sync(snapshot_version, poll_ms)
     ], style={'backgroundColor': DB_COLORS['light_gray'], 'minHeight': '100vh', **FONT_STYLE})
 
@@ -0,0 +1,155 @@
+"""Site map markers built in one grouped pass, with rendered markers cached by content"""
+import base64
+import hashlib
+import html as html_text
+import geobuf
+import numpy as np
+import pandas as pd
+from dash import html, Patch
+import dash_leaflet as dl
+from inventory_store import RISK_PRIORITY
+from memo import LRUCache
+
+RISK_COLORS = {'Out of Stock': 'red', 'Low Stock': 'gold', 'Stocked': 'green'}
+# Tooltip sections: risk level, icon, icon color
+TOOLTIP_SECTIONS = [('Stocked', '✓ ', 'green'), ('Low Stock', '⚠ ', 'orange'), ('Out of Stock', '✗ ', 'red')]
+
+
+def _codes(s, sort=False):
+    """Category codes and categories of a column (categories sorted when sort=True)"""
+    cat = s.array if isinstance(s.dtype, pd.CategoricalDtype) else pd.Categorical(s)
+    if sort and not cat.categories.is_monotonic_increasing:
+        cat = cat.reorder_categories(cat.categories.sort_values())
+    return np.asarray(cat.codes, dtype=np.int64), cat.categories
+
+
+def site_part_lists(site_parts):
+    """{(plant_id, risk_level): 'part, part, ...'} with each list sorted and de-duplicated.
+
+    Works on category codes: every (site, risk, part) combination becomes one integer whose
+    order is site, then risk, then part name, so one pass of marking distinct keys yields all
+    lists already grouped and sorted.
+    """
+    plant, plants = _codes(site_parts['plant_id'])
+    risk, risks = _codes(site_parts['risk_level'])
+    part, names = _codes(site_parts['part_name'], sort=True)
+    valid = (plant >= 0) & (risk >= 0) & (part >= 0)
+    n_parts, n_groups = max(len(names), 1), len(plants) * len(risks)
+    keys = (plant[valid] * len(risks) + risk[valid]) * n_parts + part[valid]
+    if n_groups * n_parts <= 1 << 26:
+        seen = np.zeros(n_groups * n_parts, dtype=bool)
+        seen[keys] = True
+        keys = np.flatnonzero(seen)
+    else:
+        keys = np.unique(keys)
+    if not len(keys):
+        return {}
+    groups, names = keys // n_parts, names.to_numpy(dtype=object)[keys % n_parts]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(groups)) + 1, [len(keys)]])
+    return {(plants[g // len(risks)], risks[g % len(risks)]): ', '.join(map(str, names[a:b]))
+            for g, a, b in zip(groups[bounds[:-1]], bounds[:-1], bounds[1:])}
+
+
+def _render_marker(plant_id, plant_name, lat, lon, risk, lists):
+    sections = [html.Div([html.Span(icon, style={'color': color, 'fontWeight': 'bold', 'fontSize': '14px'}),
+            html.Span(f'{rl}: ', style={'fontWeight': '500'}),
+            html.Span(pl or 'None', style={'fontSize': '11px', 'color': '#555', 'wordWrap': 'break-word'})
+        ], style={'marginBottom': '6px', 'wordWrap': 'break-word', 'overflowWrap': 'break-word'})
+        for (rl, icon, color), pl in zip(TOOLTIP_SECTIONS, lists)]
+    return dl.CircleMarker(id=f"marker-{plant_id}-{risk}",
+        center=[lat, lon], radius=10, color=RISK_COLORS[risk], fillColor=RISK_COLORS[risk], fillOpacity=0.7, weight=2,
+        children=[dl.Tooltip(html.Div([html.Div(plant_name, style={'fontWeight': 'bold', 'fontSize': '14px',
+            'marginBottom': '10px', 'paddingBottom': '8px', 'borderBottom': '2px solid #ccc', 'color': '#0B2026',
+            'wordWrap': 'break-word', 'overflowWrap': 'break-word'}), *sections], style={'padding': '8px',
+            'minWidth': '350px', 'maxWidth': '450px', 'fontFamily': 'DM Sans, sans-serif', 'lineHeight': '1.4',
+            'wordWrap': 'break-word', 'overflowWrap': 'break-word', 'whiteSpace': 'normal'}),
+            permanent=False, direction='auto')])
+
+
+def patch_markers(old_keys, new_keys, markers):
+    """A Patch turning the client's marker list (old_keys) into markers, sending only changed positions.
+
+    Falls back to the full list when the client has no markers yet or most of them changed.
+    """
+    if not old_keys or not new_keys:
+        return markers
+    changed = [i for i, key in enumerate(new_keys[:len(old_keys)]) if old_keys[i] != key]
+    if len(changed) + max(len(new_keys) - len(old_keys), 0) > len(new_keys) // 2:
+        return markers
+    patch = Patch()
+    for i in changed:
+        patch[i] = markers[i]
+    if len(new_keys) > len(old_keys):
+        patch.extend(markers[len(old_keys):])
+    for i in range(len(old_keys) - 1, len(new_keys) - 1, -1):
+        del patch[i]
+    return patch
+
+
+class MarkerBuilder:
+    """Builds one CircleMarker per site from a backend result's sites() and site_parts().
+
+    Rendered markers are cached by their content (site, location, worst risk and tooltip part
+    lists), so a site whose tooltip is unaffected by a filter change, or that looks the same in
+    a newer snapshot, reuses its component tree instead of rebuilding it; a cache entry can
+    never be stale because any change in content is a different key.
+    """
+
+    def __init__(self, maxsize=2048):
+        self.cache = LRUCache(maxsize)
+
+    def build(self, sites, site_parts):
+        """(markers, keys): the CircleMarkers plus a short content digest for each, for patch_markers"""
+        lists = site_part_lists(site_parts)
+        markers, keys = [], []
+        for r in sites.to_dict('records'):
+            pid, risk = r['plant_id'], r['risk_level']
+            key = (pid, r['plant_name'], float(r['lat']), float(r['lon']), risk,
+                   tuple(lists.get((pid, rl), '') for rl, _, _ in TOOLTIP_SECTIONS))
+            entry = self.cache.get(key)
+            if entry is None:
+                entry = (hashlib.sha1(repr(key).encode()).hexdigest()[:16], _render_marker(*key))
+                self.cache.put(key, entry)
+            keys.append(entry[0])
+            markers.append(entry[1])
+        return markers, keys
+
+    def metrics(self):
+        return self.cache.metrics()
+
+
+def site_geobuf(sites):
+    """Base64 geobuf FeatureCollection with one point per site, for a dl.GeoJSON layer with format='geobuf'.
+
+    Features only carry what the layer draws (id, name, worst risk and its rank for cluster
+    colors); tooltip part lists are left out and fetched per site when a tooltip opens. None when
+    there are no sites (geobuf cannot encode an empty collection; the layer shows nothing for None).
+    """
+    if sites.empty:
+        return None
+    features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [float(r['lon']), float(r['lat'])]},
+                 'properties': {'plant_id': str(r['plant_id']), 'plant_name': str(r['plant_name']),
+                                'risk_level': r['risk_level'], 'rank': RISK_PRIORITY[r['risk_level']]}}
+                for r in sites.to_dict('records')]
+    return base64.b64encode(geobuf.encode({'type': 'FeatureCollection', 'features': features})).decode()
+
+
+def site_tooltips(sites, site_parts):
+    """{plant_id: (plant_name, part lists per TOOLTIP_SECTIONS)} for tooltip_html"""
+    lists = site_part_lists(site_parts)
+    return {str(pid): (name, tuple(lists.get((pid, rl), '') for rl, _, _ in TOOLTIP_SECTIONS))
+            for pid, name in zip(sites['plant_id'], sites['plant_name'])}
+
+
+def tooltip_html(plant_name, lists):
+    """HTML of a site tooltip, styled like the CircleMarker tooltips"""
+    esc = html_text.escape
+    sections = ''.join(
+        f'<div style="margin-bottom:6px;overflow-wrap:break-word">'
+        f'<span style="color:{color};font-weight:bold;font-size:14px">{icon}</span>'
+        f'<span style="font-weight:500">{esc(rl)}: </span>'
+        f'<span style="font-size:11px;color:#555">{esc(pl or "None")}</span></div>'
+        for (rl, icon, color), pl in zip(TOOLTIP_SECTIONS, lists))
+    return (f'<div style="padding:8px;min-width:350px;max-width:450px;font-family:DM Sans, sans-serif;line-height:1.4;'
+            f'white-space:normal;overflow-wrap:break-word"><div style="font-weight:bold;font-size:14px;margin-bottom:10px;'
+            f'padding-bottom:8px;border-bottom:2px solid #ccc;color:#0B2026">{esc(str(plant_name))}</div>{sections}</div>')
@@ -0,0 +1,183 @@
+"""Bounded LRU memoization for dashboard results and LLM recommendations"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss/eviction counters"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': round(self.hits / lookups, 3) if lookups else None}
+
+
+class DashboardCache:
+    """Memoizes rendered dashboard outputs by (data token, filters).
+
+    The token identifies the data a result was computed from (see LocalResult.token and
+    WarehouseResult.token), so a refreshed snapshot never serves stale outputs: the first lookup
+    with a new token drops the local entries of the old one. A per-process LRU sits in front of an
+    optional flask-caching backend (`shared`, e.g. FileSystemCache or RedisCache) that lets Dash
+    workers reuse each other's results; shared entries for old tokens simply age out.
+    """
+
+    def __init__(self, maxsize=64, shared=None, timeout=None, prefix='dashboard'):
+        self.local = LRUCache(maxsize)
+        self.shared = shared
+        self.timeout = timeout
+        self.prefix = prefix
+        self.token = None
+        self.shared_hits = self.shared_misses = self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _key(self, token, filters):
+        return f"{self.prefix}:{token}:{filters!r}"
+
+    def get_or_compute(self, token, filters, compute):
+        """Cached value for (token, filters), calling compute() on a miss"""
+        with self._lock:
+            if token != self.token:
+                if self.token is not None:
+                    self.invalidations += 1
+                self.local.clear()
+                self.token = token
+        key = self._key(token, filters)
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"Shared dashboard cache read failed ({type(e).__name__}: {e})")
+            if value is not None:
+                self.shared_hits += 1
+                self.local.put(key, value)
+                return value
+            self.shared_misses += 1
+        value = compute()
+        self.local.put(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, timeout=self.timeout)
+            except Exception as e:
+                print(f"Shared dashboard cache write failed ({type(e).__name__}: {e})")
+        return value
+
+    def metrics(self):
+        return {'token': self.token, 'local': self.local.metrics(),
+                'shared': type(self.shared).__name__ if self.shared is not None else None,
+                'shared_hits': self.shared_hits, 'shared_misses': self.shared_misses, 'invalidations': self.invalidations}
+
+
+def frame_digest(*frames):
+    """Short content hash of DataFrames that ignores row and column order.
+
+    Each row is hashed with its values (columns in name order) and the row hashes are sorted
+    before digesting, so the same rows fetched in a different order hash the same and any changed,
+    added or removed row gives a different digest.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    for df in frames:
+        cols = sorted(map(str, df.columns))
+        h.update(repr(cols).encode())
+        if len(df):
+            rows = pd.util.hash_pandas_object(df.rename(columns=str)[cols], index=False).to_numpy()
+            h.update(np.sort(rows).tobytes())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+class RecommendationCache:
+    """Finished AI recommendations by key, each kept for at most ttl seconds.
+
+    Keys carry a digest of the rows a recommendation was computed from (see frame_digest), so
+    entries invalidate themselves when the inventory changes: the new rows hash to a new key and
+    the old entry is never asked for again, expiring by TTL or falling out of the LRU. As with
+    DashboardCache, an optional flask-caching backend (`shared`, e.g. FileSystemCache on disk)
+    lets workers and restarts reuse each other's answers.
+    """
+
+    def __init__(self, maxsize=128, ttl=3600, shared=None, prefix='recommendation'):
+        self.local = LRUCache(maxsize)
+        self.ttl = ttl
+        self.shared = shared
+        self.prefix = prefix
+        self.expired = self.shared_hits = self.shared_misses = 0
+
+    def _key(self, key):
+        return f"{self.prefix}:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+
+    def get(self, key):
+        """The cached value for key, or None"""
+        key = self._key(key)
+        entry = self.local.get(key)
+        if entry is not None:
+            expires, value = entry
+            if time.monotonic() < expires:
+                return value
+            self.expired += 1
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"Shared recommendation cache read failed ({type(e).__name__}: {e})")
+                value = None
+            if value is not None:
+                # The shared backend enforces its own timeout; keep it locally for at most a full TTL
+                self.shared_hits += 1
+                self.local.put(key, (time.monotonic() + self.ttl, value))
+                return value
+            self.shared_misses += 1
+        return None
+
+    def put(self, key, value):
+        key = self._key(key)
+        self.local.put(key, (time.monotonic() + self.ttl, value))
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, timeout=self.ttl)
+            except Exception as e:
+                print(f"Shared recommendation cache write failed ({type(e).__name__}: {e})")
+
+    def metrics(self):
+        return {'local': self.local.metrics(), 'ttl_seconds': self.ttl, 'expired': self.expired,
+                'shared': type(self.shared).__name__ if self.shared is not None else None,
+                'shared_hits': self.shared_hits, 'shared_misses': self.shared_misses}
@@ -0,0 +1,115 @@
+"""Compact, token-budgeted data context for INVENTORY_RECOMMENDATION_PROMPT"""
+import math
+from dataclasses import dataclass
+import pandas as pd
+from allocation import vendor_options
+from inventory_store import RISK_PRIORITY
+
+# Columns the decision rules use; lat/lon, ids and vendor columns are left out of the stock issue
+ISSUE_COLUMNS = ['plant_name', 'part_name', 'equip_name', 'work_order_id', 'planned_date', 'criticality',
+                 'required_part_quantity', 'on_hand_stock', 'reserved_qty', 'projected_available_stock', 'safety_stock',
+                 'shortage_quantity', 'risk_level']
+VENDOR_COLUMNS = ['vendor_id', 'lead_time_days', 'reliability', 'min_order_quantity']
+# Rough size of a token in characters for English text and CSV numbers; no tokenizer needed
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _numeric(df, columns):
+    return df.assign(**{c: pd.to_numeric(df[c], errors='coerce') for c in columns if c in df.columns})
+
+
+def issue_rows(gdf, site, part):
+    """One row per work order at the site: decision columns only, vendor duplicates collapsed, worst shortage first"""
+    if gdf.empty:
+        return gdf
+    rows = gdf
+    if 'plant_name' in rows.columns and site:
+        rows = rows[rows['plant_name'] == site]
+    if 'part_name' in rows.columns and part:
+        rows = rows[rows['part_name'] == part]
+    rows = _numeric(rows[[c for c in ISSUE_COLUMNS if c in rows.columns]].drop_duplicates(), ['shortage_quantity'])
+    # Every column is a tie-breaker, so the order (and what truncation keeps) does not depend on input order
+    keys = ['shortage_quantity'] * ('shortage_quantity' in rows.columns) + \
+        [c for c in ['planned_date', 'work_order_id'] + ISSUE_COLUMNS if c in rows.columns and c != 'shortage_quantity']
+    keys = list(dict.fromkeys(keys))
+    return rows.sort_values(keys, ascending=[k != 'shortage_quantity' for k in keys], na_position='last')
+
+
+def site_rows(inv, site=None):
+    """The part's position per site (constant per site in the gold table) with its worst work order and risk;
+    the selected site first, then the sites with most stock to spare"""
+    if inv.empty or 'plant_name' not in inv.columns:
+        return pd.DataFrame()
+    inv = _numeric(inv, ['on_hand_stock', 'reserved_qty', 'safety_stock', 'available_for_transfer', 'shortage_quantity'])
+    aggs = {'on_hand_stock': 'max', 'reserved_qty': 'max', 'safety_stock': 'max', 'available_for_transfer': 'max',
+            'shortage_quantity': 'max'}
+    sites = inv.groupby('plant_name', observed=True, sort=True).agg({c: f for c, f in aggs.items() if c in inv.columns})
+    sites = sites.rename(columns={'shortage_quantity': 'worst_shortage'})
+    if 'work_order_id' in inv.columns:
+        sites['work_orders'] = inv.groupby('plant_name', observed=True, sort=True)['work_order_id'].nunique()
+    if 'risk_level' in inv.columns:
+        worst = inv['risk_level'].astype(str).map(RISK_PRIORITY).groupby(inv['plant_name'].astype(str)).min()
+        levels = {rank: level for level, rank in RISK_PRIORITY.items()}
+        sites['risk_level'] = worst.reindex(sites.index.astype(str)).map(levels).to_numpy()
+    sites = sites.reset_index()
+    sites['_selected'] = sites['plant_name'] == site
+    order = ['_selected'] + (['available_for_transfer'] if 'available_for_transfer' in sites.columns else []) + ['plant_name']
+    return sites.sort_values(order, ascending=[False] * (len(order) - 1) + [True], kind='stable').drop(columns='_selected')
+
+
+def _table(df, n):
+    if df.empty:
+        return "None"
+    text = df.head(n).to_csv(index=False, float_format='%.6g').strip()
+    return text + (f"\n... {len(df) - n} more rows omitted" if n < len(df) else "")
+
+
+@dataclass
+class PromptContext:
+    prompt: str
+    tokens: int  # estimated
+    budget: int
+    issue_rows: tuple  # (kept, total)
+    site_rows: tuple
+    vendors: int
+
+    @property
+    def truncated(self):
+        return self.issue_rows[0] < self.issue_rows[1] or self.site_rows[0] < self.site_rows[1]
+
+    def describe(self):
+        return (f"~{self.tokens} tokens ({len(self.prompt)} chars, budget {self.budget}); stock issue rows "
+                f"{self.issue_rows[0]}/{self.issue_rows[1]}, site rows {self.site_rows[0]}/{self.site_rows[1]}, "
+                f"{self.vendors} vendors" + (", truncated" if self.truncated else ""))
+
+
+def build_prompt(template, gdf, inv, site, part, budget, **fields):
+    """PromptContext with template filled from compact tables ({grid_df}: the site's work orders,
+    {inventory_data}: one row per site plus the distinct vendors).
+
+    Rows are dropped from the end of the longer table until the estimated size fits the token budget;
+    the orders above put the rows the rules need first, so the same inputs always keep the same rows.
+    At least one row of each table is kept even if that exceeds the budget.
+    """
+    issues, sites = issue_rows(gdf, site, part), site_rows(inv, site)
+    vendors = vendor_options(inv)[VENDOR_COLUMNS] if not inv.empty else pd.DataFrame()
+
+    def render(n_issues, n_sites):
+        inventory = f"Sites:\n{_table(sites, n_sites)}\n\nVendors for this part:\n{_table(vendors, len(vendors))}"
+        return template.format(grid_df=_table(issues, n_issues), inventory_data=inventory, **fields)
+
+    n_issues, n_sites = len(issues), len(sites)
+    prompt = render(n_issues, n_sites)
+    while estimate_tokens(prompt) > budget and (n_issues > 1 or n_sites > 1):
+        # Trim the longer table by an eighth (at least one row) per step
+        if n_issues >= n_sites:
+            n_issues -= max(1, n_issues // 8)
+        else:
+            n_sites -= max(1, n_sites // 8)
+        prompt = render(n_issues, n_sites)
+    return PromptContext(prompt, estimate_tokens(prompt), budget, (min(n_issues, len(issues)), len(issues)),
+                         (min(n_sites, len(sites)), len(sites)), len(vendors))
@@ -0,0 +1,83 @@
+"""Parameterized SELECT builder for column projection and predicate pushdown"""
+import re
+from dataclasses import dataclass, replace
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_COMPARISONS = {'=', '!=', '<>', '<', '<=', '>', '>='}
+_LIST_OPERATORS = {'IN', 'NOT IN'}
+_NULL_OPERATORS = {'IS NULL', 'IS NOT NULL'}
+
+
+def quote_identifier(name):
+    """Backtick-quote a column name, rejecting anything that is not a plain identifier"""
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return f"`{name}`"
+
+
+@dataclass(frozen=True)
+class TableQuery:
+    """Immutable description of `SELECT <columns> FROM <source> WHERE <predicates>`.
+
+    `source` is trusted configuration (a table name or table-valued function call); columns and
+    predicate operators are validated and every value is bound as a named parameter.
+
+        (TableQuery(TABLE_NAME).select('plant_id', 'risk_level')
+            .where_in('plant_id', ['P1', 'P2']).where('planned_date', '>=', date(2026, 1, 1)))
+    """
+    source: str
+    columns: tuple = ()
+    predicates: tuple = ()
+    distinct: bool = False
+
+    def select(self, *columns):
+        for c in columns:
+            quote_identifier(c)
+        return replace(self, columns=tuple(dict.fromkeys(columns)))
+
+    def unique(self):
+        """SELECT DISTINCT the projected columns"""
+        return replace(self, distinct=True)
+
+    def where(self, column, op, value=None):
+        op = op.upper().strip()
+        quote_identifier(column)
+        if op not in _COMPARISONS | _LIST_OPERATORS | _NULL_OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        if op in _LIST_OPERATORS:
+            value = tuple(value)
+        return replace(self, predicates=self.predicates + ((column, op, value),))
+
+    def where_in(self, column, values):
+        return self.where(column, 'IN', values)
+
+    def where_clause(self, params=None):
+        """Return (' WHERE ...' or '', parameters) so callers can compose their own SELECT"""
+        params = {} if params is None else params
+        clauses = []
+
+        def bind(value):
+            name = f"p{len(params)}"
+            params[name] = value
+            return f":{name}"
+
+        for column, op, value in self.predicates:
+            col = quote_identifier(column)
+            if op in _NULL_OPERATORS:
+                clauses.append(f"{col} {op}")
+            elif op in _LIST_OPERATORS:
+                # An empty IN list matches nothing (NOT IN matches everything)
+                if value:
+                    clauses.append(f"{col} {op} ({', '.join(bind(v) for v in value)})")
+                else:
+                    clauses.append('1 = 0' if op == 'IN' else '1 = 1')
+            else:
+                clauses.append(f"{col} {op} {bind(value)}")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def to_sql(self):
+        """Return (sql, parameters) for cursor.execute"""
+        where, params = self.where_clause()
+        cols = ', '.join(quote_identifier(c) for c in self.columns) if self.columns else '*'
+        select = "SELECT DISTINCT" if self.distinct else "SELECT"
+        return f"{select} {cols} FROM {self.source}{where}", params
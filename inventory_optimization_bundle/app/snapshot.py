@@ -0,0 +1,159 @@
+"""Versioned inventory snapshot with background refresh"""
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+import pandas as pd
+from inventory_store import InventoryStore
+from filter_index import FILTER_COLUMNS
+
+DEFAULT_MAP_CENTER = [-26.65, 152.95]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One immutable version of the inventory data plus the filter options derived from it"""
+    version: int
+    store: InventoryStore
+    loaded_at: float = 0.0
+    sites: list = field(default_factory=list)
+    parts: list = field(default_factory=list)
+    equipment: list = field(default_factory=list)
+    map_center: list = field(default_factory=lambda: list(DEFAULT_MAP_CENTER))
+    summary: InventoryStore = None  # store.risk_summary(), built once per version
+
+    # store and summary are both given a FilterIndex on FILTER_COLUMNS here
+
+    @classmethod
+    def from_store(cls, version, store):
+        store.build_index(FILTER_COLUMNS)
+        center = list(DEFAULT_MAP_CENTER)
+        if not store.empty and 'lat' in store.columns and 'lon' in store.columns:
+            center = [float(store.frame['lat'].mean()), float(store.frame['lon'].mean())]
+        return cls(version=version, store=store, loaded_at=time.time(), sites=store.options('plant_name'),
+                   parts=store.options('part_name'), equipment=store.options('equip_name'), map_center=center,
+                   summary=store.risk_summary().build_index(FILTER_COLUMNS))
+
+    @property
+    def cache_token(self):
+        """Identifies this snapshot's data for result caches shared across workers.
+
+        A load watermark (Delta version or max watermark column) means the same data in every
+        worker; without one, results are only shareable within this process.
+        """
+        watermark = self.store.watermark
+        if watermark is not None:
+            return f"wm-{watermark}"
+        return f"pid{os.getpid()}-v{self.version}"
+
+
+def _jsonable(value):
+    return value if value is None or isinstance(value, (int, float, str)) else str(value)
+
+
+class SnapshotManager:
+    """Owns the current Snapshot and replaces it from a background refresher thread.
+
+    `loader(previous_store)` returns a new InventoryStore, the previous store itself when nothing
+    changed (no new version is published), or raises. A refresh builds the new snapshot off to the
+    side and publishes it with a single reference assignment, so callbacks that already called
+    `current()` keep reading the version they started with. A failed refresh keeps the previous
+    snapshot. Each process (e.g. gunicorn worker) refreshes its own copy.
+
+    With a SnapshotCache, `warm_start()` serves the last cached snapshot immediately and every
+    published snapshot is written back to the cache.
+    """
+
+    def __init__(self, loader, interval=0, cache=None):
+        self._loader = loader
+        self.interval = interval
+        self.cache = cache
+        self._current = Snapshot.from_store(0, InventoryStore(pd.DataFrame()))
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._full_requested = False
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+
+    def current(self):
+        """Latest published snapshot; hold on to it for the duration of a request"""
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version
+
+    @property
+    def ready(self):
+        """True once any snapshot (cached or live) has been published"""
+        return self._current.version > 0
+
+    def refresh(self, full=False):
+        """Reload synchronously and publish a new version if the data changed; returns True on success"""
+        with self._refresh_lock:
+            started = time.time()
+            previous = self._current.store
+            try:
+                store = self._loader(None if full or previous.empty else previous)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"!!! ERROR refreshing inventory snapshot: {self.last_error}")
+                traceback.print_exc()
+                return False
+            self.last_error = None
+            if store is previous:
+                print(f"Inventory snapshot v{self._current.version} is up to date ({time.time() - started:.1f}s)")
+                return True
+            self._publish(store)
+            print(f"Published inventory snapshot v{self._current.version} ({store.summary()}) "
+                  f"in {time.time() - started:.1f}s")
+            if self.cache:
+                self.cache.save(store)
+            return True
+
+    def warm_start(self):
+        """Publish the cached snapshot, if valid, and schedule a live refresh; returns True if served from cache"""
+        store = self.cache.load() if self.cache else None
+        if store is None:
+            return False
+        with self._refresh_lock:
+            self._publish(store)
+        self.request_refresh()
+        return True
+
+    def _publish(self, store):
+        self._current = Snapshot.from_store(self._current.version + 1, store)
+
+    def request_refresh(self, full=False):
+        """Ask the background thread to refresh now"""
+        self._full_requested = self._full_requested or full
+        self._wake.set()
+
+    def start(self):
+        """Start the refresher thread; with interval <= 0 it only refreshes on request"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='snapshot-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            full, self._full_requested = self._full_requested, False
+            self.refresh(full=full)
+
+    def status(self):
+        snap = self._current
+        return {'version': snap.version, 'rows': len(snap.store), 'loaded_at': snap.loaded_at,
+                'memory_bytes': snap.store.memory_usage(), 'watermark': _jsonable(snap.store.watermark),
+                'refresh_interval': self.interval, 'last_error': self.last_error}
@@ -0,0 +1,118 @@
+"""Local Arrow IPC cache of the inventory snapshot for fast cold starts"""
+import hashlib
+import json
+import numbers
+import os
+import time
+import traceback
+import pyarrow as pa
+from inventory_store import InventoryStore
+
+# Bump when the cached layout or InventoryStore encoding changes so old files are ignored
+CACHE_FORMAT_VERSION = 2
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _schema_fingerprint(schema):
+    return hashlib.sha256(str(schema.remove_metadata()).encode()).hexdigest()
+
+
+class SnapshotCache:
+    """Arrow IPC file plus a JSON sidecar (checksum, schema fingerprint, source, watermark).
+
+    `source` identifies what was loaded (table name plus any column/row pushdown). `load()`
+    returns an InventoryStore, or None when the cache is missing, truncated, for another source,
+    schema or format version, older than max_age seconds, or corrupt. A corrupt file must never
+    reach to_pandas (damaged offsets can crash the process, damaged values load silently), so
+    the file's SHA-256 is checked against the sidecar (`verify()`) and the mapped table is
+    fully validated by Arrow before conversion. verify=False skips only the checksum pass,
+    leaving the Arrow validation, which catches damaged structure but not changed values.
+    Categorical columns are written as Arrow dictionary arrays, so the file stays as compact as
+    the snapshot.
+    """
+
+    def __init__(self, path, source, max_age=24 * 3600, verify=True):
+        self.path = path
+        self.meta_path = path + '.json'
+        self.source = source
+        self.max_age = max_age
+        self.verify_on_load = verify
+
+    def _meta(self):
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def verify(self):
+        """True if the cache file matches the checksum written with it (reads the whole file)"""
+        try:
+            return _sha256(self.path) == self._meta()['sha256']
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def load(self):
+        started = time.time()
+        try:
+            meta = self._meta()
+            if meta.get('format') != CACHE_FORMAT_VERSION or meta.get('source') != self.source:
+                print("Snapshot cache ignored: written for a different source or format")
+                return None
+            if self.max_age and time.time() - meta['created_at'] > self.max_age:
+                print(f"Snapshot cache ignored: older than {self.max_age}s")
+                return None
+            if os.path.getsize(self.path) != meta['bytes']:
+                print("Snapshot cache ignored: file size does not match its metadata")
+                return None
+            if self.verify_on_load and not self.verify():
+                print("Snapshot cache ignored: checksum mismatch")
+                return None
+            with pa.memory_map(self.path, 'r') as source:
+                reader = pa.ipc.open_file(source)
+                if _schema_fingerprint(reader.schema) != meta['schema']:
+                    print("Snapshot cache ignored: schema does not match its metadata")
+                    return None
+                # Zero-copy over the mapped pages; to_pandas is the only copy made
+                table = reader.read_all()
+                if table.num_rows != meta['rows']:
+                    print("Snapshot cache ignored: row count does not match its metadata")
+                    return None
+                table.validate(full=True)
+                store = InventoryStore(table.to_pandas(), watermark=meta.get('watermark'))
+                del table
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Snapshot cache unreadable ({type(e).__name__}: {e}); falling back to a live load")
+            return None
+        print(f"Loaded snapshot cache {self.path} ({store.summary()}) in {time.time() - started:.2f}s")
+        return store
+
+    def save(self, store):
+        """Atomically replace the cache with the given store; failures are logged, not raised"""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            table = pa.Table.from_pandas(store.frame, preserve_index=False)
+            with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            watermark = store.watermark
+            meta = {'format': CACHE_FORMAT_VERSION, 'source': self.source, 'created_at': time.time(),
+                    'rows': table.num_rows, 'schema': _schema_fingerprint(table.schema), 'sha256': _sha256(tmp),
+                    'bytes': os.path.getsize(tmp),
+                    # Only plain version numbers survive a restart; other watermarks force a full reload
+                    'watermark': int(watermark) if isinstance(watermark, numbers.Integral) else None}
+            os.replace(tmp, self.path)
+            with open(self.meta_path + '.tmp', 'w') as f:
+                json.dump(meta, f)
+            os.replace(self.meta_path + '.tmp', self.meta_path)
+        except Exception as e:
+            print(f"!!! ERROR writing snapshot cache: {e}")
+            traceback.print_exc()
+            if os.path.exists(tmp):
+                os.remove(tmp)
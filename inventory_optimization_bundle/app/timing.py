@@ -0,0 +1,31 @@
+"""Per-output callback timing"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class OutputTimer:
+    """Records count, mean, max and last duration (ms) per named dashboard output"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def record(self, name, ms):
+        with self._lock:
+            count, total, worst, _ = self._stats.get(name, (0, 0.0, 0.0, 0.0))
+            self._stats[name] = (count + 1, total + ms, max(worst, ms), ms)
+
+    def metrics(self):
+        with self._lock:
+            return {name: {'count': count, 'mean_ms': round(total / count, 2), 'max_ms': round(worst, 2),
+                           'last_ms': round(last, 2)}
+                    for name, (count, total, worst, last) in self._stats.items()}
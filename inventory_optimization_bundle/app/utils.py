@@ -1,27 +1,209 @@
 """Databricks utilities: SQL connection and LLM calls"""
 import os
+import threading
+import time
+from contextlib import contextmanager
 from functools import lru_cache
 from databricks import sql
 from databricks.sdk.core import Config
 from databricks.sdk import WorkspaceClient
 from databricks.sdk.service.serving import ChatMessage, ChatMessageRole
+from query import TableQuery
 
 # Use environment variable or default profile
 cfg = Config()
 hostname = cfg.host.replace("https://", "").replace("http://", "") if cfg.host else cfg.host
 
-@lru_cache(maxsize=1)
-def get_connection(http_path):
-    """Create cached Databricks SQL connection"""
-    return sql.connect(server_hostname=hostname, http_path=http_path, 
-                      credentials_provider=lambda: cfg.authenticate)
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "4"))
+SQL_POOL_MAX_IDLE_SECONDS = int(os.getenv("SQL_POOL_MAX_IDLE_SECONDS", "300"))
 
-def read_table(table_name, conn):
-    """Read table data into pandas DataFrame"""
+class ConnectionPool:
+    """Thread-safe pool of Databricks SQL connections.
+
+    Connections are checked out with `with pool.connection() as conn:`. Idle connections older than
+    max_idle are closed; a connection idle for more than validate_after seconds is health-checked
+    (`SELECT 1`) on checkout and replaced if it has dropped. New connections are opened with
+    exponential backoff. `metrics()` reports pool usage and checkout wait times.
+    """
+
+    def __init__(self, connect, size=4, max_idle=300, validate_after=30, wait_timeout=60, retries=3, backoff=0.5):
+        self._connect = connect
+        self.size = size
+        self.max_idle = max_idle
+        self.validate_after = validate_after
+        self.wait_timeout = wait_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = []  # (connection, last_used) with the most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {'created': 0, 'reconnects': 0, 'evicted': 0, 'checkouts': 0,
+                       'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            # Don't hand a dropped connection to the next caller
+            broken = not self._healthy(conn)
+            raise
+        finally:
+            with self._cond:
+                if broken:
+                    self._open -= 1
+                    self._close(conn)
+                else:
+                    self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                if not self._cond.wait(deadline - time.monotonic()):
+                    raise TimeoutError(f"No SQL connection available after {self.wait_timeout}s")
+            waited = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+        try:
+            if conn is None:
+                return self._create()
+            if time.monotonic() - last_used > self.validate_after and not self._healthy(conn):
+                self._close(conn)
+                with self._cond:
+                    self._stats['reconnects'] += 1
+                return self._create()
+            return conn
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _create(self):
+        for attempt in range(self.retries + 1):
+            try:
+                conn = self._connect()
+                with self._cond:
+                    self._stats['created'] += 1
+                return conn
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                print(f"SQL connect failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            if getattr(conn, 'open', True) is False:
+                return False
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        """Close connections idle longer than max_idle (caller holds the lock)"""
+        now = time.monotonic()
+        stale = [c for c, used in self._idle if now - used > self.max_idle]
+        if stale:
+            self._idle = [(c, used) for c, used in self._idle if now - used <= self.max_idle]
+            self._open -= len(stale)
+            self._stats['evicted'] += len(stale)
+            for c in stale:
+                self._close(c)
+
+    def metrics(self):
+        with self._cond:
+            return {'size': self.size, 'open': self._open, 'idle': len(self._idle),
+                    'in_use': self._open - len(self._idle), **self._stats}
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for c, _ in idle:
+            self._close(c)
+
+@lru_cache(maxsize=None)
+def get_pool(http_path):
+    """Shared connection pool for a SQL warehouse"""
+    return ConnectionPool(lambda: sql.connect(server_hostname=hostname, http_path=http_path,
+                                              credentials_provider=lambda: cfg.authenticate),
+                          size=SQL_POOL_SIZE, max_idle=SQL_POOL_MAX_IDLE_SECONDS)
+
+def _table_query(source, columns=None, where=(), distinct=False):
+    query = TableQuery(source).select(*(columns or ()))
+    if distinct:
+        query = query.unique()
+    for column, op, *value in where or ():
+        query = query.where(column, op, *value)
+    return query
+
+def read_table(table_name, conn, columns=None, where=(), distinct=False):
+    """Read table data into pandas DataFrame.
+
+    columns limits the projection; where is a list of (column, op, value) predicates pushed down
+    to the warehouse as bound parameters, e.g. [('plant_id', 'IN', ['P1', 'P2'])]; distinct
+    returns each projected row once.
+    """
+    sql, params = _table_query(table_name, columns, where, distinct).to_sql()
+    return read_sql(sql, conn, params)
+
+def read_sql(sql, conn, params=None):
+    """Run a parameterized query and return the result as a pandas DataFrame"""
     with conn.cursor() as cursor:
-        cursor.execute(f"SELECT * FROM {table_name}")
+        cursor.execute(sql, params or None)
         return cursor.fetchall_arrow().to_pandas()
 
+def read_table_batches(table_name, conn, batch_size=100_000, columns=None, where=(), distinct=False):
+    """Stream table data as Arrow tables of at most batch_size rows (same columns/where/distinct as read_table)"""
+    sql, params = _table_query(table_name, columns, where, distinct).to_sql()
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params or None)
+        while True:
+            batch = cursor.fetchmany_arrow(batch_size)
+            if batch.num_rows == 0:
+                break
+            yield batch
+
+def get_table_version(table_name, conn):
+    """Latest Delta commit version of a table"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"DESCRIBE HISTORY {table_name} LIMIT 1")
+        return int(cursor.fetchone().version)
+
+def read_table_changes(table_name, conn, start_version, columns=None, where=()):
+    """Read Delta change data feed rows committed at or after start_version"""
+    name = table_name.replace("'", "''")
+    return read_table(f"table_changes('{name}', {int(start_version)})", conn, columns, where)
+
+LLM_SYSTEM_PROMPT = ("You are a supply chain optimization expert. Provide actionable recommendations for inventory "
+                     "management and part allocation.")
+
 def call_databricks_llm(prompt, endpoint_name="databricks-claude-sonnet-4-5", max_tokens=3000):
     """Call Databricks LLM serving endpoint with prompt"""
     try:
@@ -31,7 +213,7 @@ def call_databricks_llm(prompt, endpoint_name="databricks-claude-sonnet-4-5", ma
             messages=[
                 ChatMessage(
                     role=ChatMessageRole.SYSTEM,
-                    content="You are a supply chain optimization expert. Provide actionable recommendations for inventory management and part allocation."
+                    content=LLM_SYSTEM_PROMPT
                 ),
                 ChatMessage(
                     role=ChatMessageRole.USER,
@@ -44,4 +226,26 @@ def call_databricks_llm(prompt, endpoint_name="databricks-claude-sonnet-4-5", ma
     except Exception as e:
         return f"Error calling LLM: {str(e)}"
 
+def stream_databricks_llm(prompt, endpoint_name="databricks-claude-sonnet-4-5", max_tokens=3000):
+    """Yield the completion for prompt in pieces as the endpoint generates it.
+
+    Uses the serving endpoint's OpenAI-compatible chat API with stream=True. Unlike
+    call_databricks_llm, errors are raised, so callers can fall back to the blocking call
+    when an endpoint does not stream.
+    """
+    client = WorkspaceClient().serving_endpoints.get_open_ai_client()
+    stream = client.chat.completions.create(
+        model=endpoint_name,
+        messages=[{'role': 'system', 'content': LLM_SYSTEM_PROMPT}, {'role': 'user', 'content': prompt}],
+        max_tokens=max_tokens,
+        stream=True
+    )
+    try:
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None
+            if delta:
+                yield delta
+    finally:
+        stream.close()
+
 
@@ -0,0 +1,40 @@
+"""Compact columnar wire format for grid rows, decoded in the browser by assets/wire.js"""
+import pandas as pd
+
+
+def _dictionary_encodable(s):
+    return not pd.api.types.is_numeric_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype)
+
+
+def encode_columns(df, max_ratio=0.5):
+    """{'n': rows, 'columns': {name: values}} for df.
+
+    Columns are sent as one value array each instead of one dict per row, so column names are
+    not repeated on every row. Non-numeric columns with few distinct values (plant_name,
+    risk_level, dates, ...) are dictionary encoded as {'dict': distinct values, 'codes': indexes},
+    with code -1 for missing values; assets/wire.js turns the payload back into row dicts.
+    """
+    n = len(df)
+    columns = {}
+    for name in df.columns:
+        s = df[name]
+        if _dictionary_encodable(s):
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+            if len(uniques) <= n * max_ratio:
+                columns[name] = {'dict': list(uniques.astype(object)), 'codes': codes.tolist()}
+                continue
+            s = s.astype(object).where(s.notna(), None)
+        columns[name] = s.tolist()
+    return {'n': n, 'columns': columns}
+
+
+def decode_columns(payload):
+    """Row dicts from an encode_columns payload (what the browser builds; used for checks)"""
+    names, cols = list(payload['columns']), []
+    for name in names:
+        col = payload['columns'][name]
+        if isinstance(col, dict):
+            values = col['dict']
+            col = [values[c] if c >= 0 else None for c in col['codes']]
+        cols.append(col)
+    return [dict(zip(names, row)) for row in zip(*cols)] if names else [{} for _ in range(payload['n'])]
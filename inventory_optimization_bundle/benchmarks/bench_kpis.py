@@ -0,0 +1,55 @@
+"""Benchmark the KPI table: per-plant groupby().apply() lambda vs the vectorized engine.
+
+Run from the bundle directory:  python benchmarks/bench_kpis.py [rows ...]
+"""
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from synthetic import make_inventory  # noqa: E402
+from inventory_store import InventoryStore  # noqa: E402
+from kpis import risk_shares  # noqa: E402
+
+SIZES = [1_000, 100_000, 1_000_000]
+
+
+def legacy_kpis(df):
+    """The original update_dashboard KPI block (formatted strings per plant)"""
+    return df.groupby('plant_name', observed=True).apply(lambda x: pd.Series({
+        'Sufficient Inventory': f"{(len(x[x['risk_level'] == 'Stocked']) / len(x) * 100):.1f}%",
+        'Low Inventory Risk': f"{(len(x[x['risk_level'] == 'Low Stock']) / len(x) * 100):.1f}%",
+        'Stockout Risk': f"{(len(x[x['risk_level'] == 'Out of Stock']) / len(x) * 100):.1f}%"
+    }), include_groups=False).reset_index()
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'lambda ms':>10} {'engine ms':>10} {'summary ms':>11} {'speedup':>8}")
+    for n in sizes:
+        store = InventoryStore(make_inventory(n))
+        df, summary = store.frame, store.risk_summary().frame
+        # Same numbers as the lambda, formatted the way the KPI table renders them
+        engine = risk_shares(df['plant_name'], df['risk_level'])
+        legacy = legacy_kpis(df)
+        for label in ['Sufficient Inventory', 'Low Inventory Risk', 'Stockout Risk']:
+            assert [f"{v:.1f}%" for v in engine[label]] == list(legacy[label]), label
+        repeat = 3 if n >= 1_000_000 else 10
+        t_legacy = best_of(lambda: legacy_kpis(df), repeat)
+        t_engine = best_of(lambda: risk_shares(df['plant_name'], df['risk_level']), repeat)
+        t_summary = best_of(lambda: risk_shares(summary['plant_name'], summary['risk_level'], summary['rows']), repeat)
+        print(f"{n:>10} {t_legacy * 1000:>10.2f} {t_engine * 1000:>10.2f} {t_summary * 1000:>11.2f} "
+              f"{t_legacy / t_engine:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or SIZES)
@@ -0,0 +1,51 @@
+"""Benchmark the map marker pipelines: one CircleMarker component tree per site vs one geobuf layer.
+
+Run from the bundle directory:  python benchmarks/bench_map_layers.py [sites ...]
+
+Reports server build time and the callback payload size for each MAP_MARKER_MODE. In geojson
+mode tooltips are not part of the payload; the tooltip columns show the one grouped pass that
+prepares every site's part lists and the size of one tooltip response. Browser-side rendering
+(one Leaflet layer and React component per marker vs one clustered canvas of points) is not
+measured here.
+"""
+import os
+import sys
+import time
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from synthetic import make_inventory  # noqa: E402
+from inventory_store import InventoryStore  # noqa: E402
+from markers import MarkerBuilder, site_geobuf, site_tooltips, tooltip_html  # noqa: E402
+
+SITES = [10, 100, 1_000, 5_000]
+ROWS_PER_SITE = 20
+
+
+def timed(fn):
+    started = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - started) * 1000
+
+
+def main(site_counts):
+    print(f"{'sites':>7} {'markers ms':>11} {'markers bytes':>14} {'geobuf ms':>10} {'geobuf bytes':>13} "
+          f"{'size':>7} {'tooltips ms':>12} {'tooltip bytes':>14}")
+    for n_sites in site_counts:
+        summary = InventoryStore(make_inventory(n_sites * ROWS_PER_SITE, n_sites=n_sites)).risk_summary().frame
+        # The frames LocalResult.sites() and site_parts() return
+        sites = summary.groupby(['plant_id', 'plant_name', 'lat', 'lon'], observed=True).agg(
+            risk_level=('risk_level', 'min')).reset_index()
+        site_parts = summary[['plant_id', 'risk_level', 'part_name']]
+        (markers, _), t_markers = timed(lambda: MarkerBuilder().build(sites, site_parts))
+        marker_bytes = len(to_json_plotly(markers))
+        layer, t_layer = timed(lambda: site_geobuf(sites))
+        layer_bytes = len(to_json_plotly(layer))
+        tooltips, t_tooltips = timed(lambda: site_tooltips(sites, site_parts))
+        tooltip_bytes = sum(len(tooltip_html(*t).encode()) for t in tooltips.values()) // max(len(tooltips), 1)
+        print(f"{len(sites):>7} {t_markers:>11.1f} {marker_bytes:>14,} {t_layer:>10.1f} {layer_bytes:>13,} "
+              f"{layer_bytes / marker_bytes:>7.1%} {t_tooltips:>12.1f} {tooltip_bytes:>14,}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or SITES)
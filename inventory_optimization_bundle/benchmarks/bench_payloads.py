@@ -0,0 +1,82 @@
+"""Report grid and map marker payload sizes per encoding over the standard dashboard filter set.
+
+Run from the bundle directory:  python benchmarks/bench_payloads.py [rows]
+
+Grid rows are measured as per-row dicts (GRID_WIRE_FORMAT=records) and in the columnar format
+(GRID_WIRE_FORMAT=columnar). Both are timed through plotly's stdlib json and orjson engines;
+Dash uses orjson when it is installed. Marker payloads are component trees, so they have no
+columnar form.
+"""
+import gzip
+import os
+import sys
+import time
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from synthetic import make_inventory  # noqa: E402
+from inventory_store import InventoryStore, RISK_PRIORITY  # noqa: E402
+from markers import MarkerBuilder  # noqa: E402
+from wire import encode_columns, decode_columns  # noqa: E402
+
+# The filter combinations used for dashboard measurements: everything, one dropdown at a time, and a drill-down
+STANDARD_FILTERS = {
+    'all': {},
+    'site': {'plant_name': 'Site 1'},
+    'equipment': {'equip_name': 'Equipment 3'},
+    'part': {'part_name': 'Part 7'},
+    'risk': {'risk_level': 'Low Stock'},
+    'site+risk': {'plant_name': 'Site 2', 'risk_level': 'Out of Stock'},
+}
+ENGINES = ['json', 'orjson']
+
+
+def measure(payload):
+    """(bytes, gzip bytes, {engine: encode ms}); both engines produce the same bytes"""
+    ms = {}
+    for engine in ENGINES:
+        started = time.perf_counter()
+        raw = to_json_plotly(payload, engine=engine).encode()
+        ms[engine] = (time.perf_counter() - started) * 1000
+    return len(raw), len(gzip.compress(raw)), ms
+
+
+def grid_rows(df):
+    """The grid rows LocalResult.grid() sends (backends needs workspace credentials to import)"""
+    gdf = df.drop_duplicates(subset=['plant_name', 'part_name', 'equip_name', 'work_order_id'], keep='first')
+    return gdf.assign(risk_sort=gdf['risk_level'].map(RISK_PRIORITY).astype('int8')).sort_values('risk_sort')
+
+
+def map_markers(builder, summary):
+    """The map markers LocalResult.sites() and site_parts() render to"""
+    if summary.empty:
+        return []
+    sites = summary.groupby(['plant_id', 'plant_name', 'lat', 'lon'], observed=True).agg(
+        risk_level=('risk_level', 'min')).reset_index()
+    return builder.build(sites, summary[['plant_id', 'risk_level', 'part_name']])[0]
+
+
+def main(n):
+    store = InventoryStore(make_inventory(n)).build_index()
+    summary = store.risk_summary().build_index()
+    builder = MarkerBuilder()
+    print(f"{n} rows; encode ms with plotly's json / orjson engines")
+    print(f"{'filters':<10} {'payload':<14} {'rows':>7} {'bytes':>12} {'gzip':>10} {'json ms':>9} {'orjson ms':>10} "
+          f"{'vs records':>11}")
+    for name, filters in STANDARD_FILTERS.items():
+        gdf = grid_rows(store.select(**filters))
+        records, columnar = gdf.to_dict('records'), encode_columns(gdf)
+        assert to_json_plotly(decode_columns(columnar)) == to_json_plotly(records), name
+        markers = map_markers(builder, summary.select(**filters))
+        base = None
+        for label, payload, count in [('grid records', records, len(gdf)), ('grid columnar', columnar, len(gdf)),
+                                      ('markers', markers, len(markers))]:
+            size, zipped, ms = measure(payload)
+            base = base or size
+            ratio = f"{size / base:.1%}" if label.startswith('grid') else ''
+            print(f"{name:<10} {label:<14} {count:>7} {size:>12,} {zipped:>10,} {ms['json']:>9.1f} {ms['orjson']:>10.1f} "
+                  f"{ratio:>11}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,34 @@
+"""Synthetic gold_master_part_inventory rows for benchmarks"""
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+
+def make_inventory(n=1000, n_sites=8, n_parts=200, n_equipment=40, seed=0):
+    """DataFrame shaped like the gold table, with risk_level derived the same way as the SQL"""
+    rng = np.random.default_rng(seed)
+    site = rng.integers(0, n_sites, n)
+    part = rng.integers(0, n_parts, n)
+    equip = rng.integers(0, n_equipment, n)
+    on_hand = rng.integers(0, 60, n)
+    reserved = rng.integers(0, 10, n)
+    required = rng.integers(0, 15, n)
+    projected = on_hand - reserved - required
+    safety = np.maximum(on_hand * 0.2, 5).round(1)
+    risk = np.where(projected < 0, 'Out of Stock', np.where(projected < safety, 'Low Stock', 'Stocked'))
+    labels = lambda prefix, codes, width=0: np.char.add(prefix, np.char.zfill(codes.astype(str), width))
+    return pd.DataFrame({
+        'plant_id': labels('PL', site, 3), 'plant_name': labels('Site ', site),
+        'lat': -26 + site % 100 * 0.1, 'lon': 152 + site // 100 * 0.1,  # valid coordinates for up to 10k sites
+        'part_id': labels('PT', part, 4), 'part_name': labels('Part ', part),
+        'equip_id': labels('EQ', equip, 3), 'equip_name': labels('Equipment ', equip),
+        'work_order_id': labels('WO', rng.integers(0, max(n // 4, 1), n), 6),
+        'planned_date': np.datetime64(dt.date(2026, 1, 1)) + rng.integers(0, 300, n).astype('timedelta64[D]'),
+        'required_part_quantity': required, 'criticality': rng.choice(['High', 'Medium', 'Low'], n),
+        'on_hand_stock': on_hand, 'reserved_qty': reserved, 'total_future_demand': required * 2,
+        'projected_available_stock': projected, 'safety_stock': safety,
+        'will_breach_safety_stock': projected < safety, 'shortage_quantity': np.maximum(safety - projected, 0),
+        'risk_level': risk, 'available_for_transfer': np.maximum(on_hand - reserved - safety, 0),
+        'vendor_id': labels('V', rng.integers(0, 5, n)), 'lead_time_days': rng.integers(1, 60, n),
+        'min_order_quantity': rng.integers(1, 20, n), 'reliability': rng.random(n).round(2),
+    })
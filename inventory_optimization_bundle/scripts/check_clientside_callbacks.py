@@ -0,0 +1,58 @@
+"""Check that the pure UI toggles run in the browser and never reach the Flask process.
+
+Run from the bundle directory (needs the same environment as the app):
+    python scripts/check_clientside_callbacks.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from app import app  # noqa: E402
+
+# Output ids of the toggles (multi-output callbacks are keyed as "..a.b...c.d..")
+CLIENTSIDE_OUTPUTS = {
+    'toggle_ai_button': ['ai-allocation-button.disabled', 'ai-allocation-button.style'],
+    'toggle_welcome': ['welcome-modal.style'],
+    'toggle_ai_modal': ['ai-modal.style', 'ai-loading.style', 'ai-response-content.style'],
+    'toggle_chat_panel': ['chat-panel.style'],
+}
+
+
+def _outputs(dep):
+    """Output prop ids of a /_dash-dependencies entry, without the allow_duplicate suffix"""
+    return [o.split('@')[0] for o in dep['output'].strip('.').split('...')]
+
+
+def main():
+    client = app.server.test_client()
+    app.server.logger.disabled = True  # the probes below are expected to fail inside Dash
+    deps = client.get('/_dash-dependencies').get_json()
+    failures = []
+    for name, outputs in CLIENTSIDE_OUTPUTS.items():
+        matches = [d for d in deps if _outputs(d) == outputs]
+        if not matches:
+            failures.append(f"{name}: no callback writes {outputs}")
+            continue
+        dep = matches[0]
+        if not dep.get('clientside_function'):
+            failures.append(f"{name}: registered as a server callback")
+        # The renderer never posts clientside callbacks; if it did, no server handler would answer
+        body = {'output': dep['output'], 'outputs': [{'id': o.split('.')[0], 'property': o.split('.')[1]}
+                                                     for o in outputs],
+                'inputs': [{'id': i['id'], 'property': i['property'], 'value': None} for i in dep['inputs']],
+                'state': [{'id': s['id'], 'property': s['property'], 'value': None} for s in dep['state']],
+                'changedPropIds': []}
+        try:
+            status = client.post('/_dash-update-component', json=body).status_code
+        except KeyError:
+            status = 'unhandled'
+        if status == 200:
+            failures.append(f"{name}: /_dash-update-component answered with 200")
+        print(f"{name}: clientside={bool(dep.get('clientside_function'))} server={status}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Check that incremental snapshot merges replace rows whose key columns changed dtype.
+
+work_order_id and vendor_id come from LEFT JOINs, so a snapshot with NULLs holds them as float64
+while a change set without NULLs holds them as int64; merging must still match them by value.
+
+Run from the bundle directory (no workspace needed):
+    python scripts/check_snapshot_merge.py
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from inventory_store import InventoryStore  # noqa: E402
+
+KEY = ['plant_id', 'part_id', 'work_order_id', 'vendor_id']
+
+
+def main():
+    snapshot = InventoryStore(pd.DataFrame({
+        'plant_id': ['P1', 'P1', 'P2', 'P3'], 'part_id': [1, 1, 2, 3],
+        'work_order_id': [100.0, np.nan, 7.0, 8.0], 'vendor_id': [5.0, 5.0, np.nan, 6.0],
+        'on_hand_stock': [1, 2, 3, 4]}))
+    failures = []
+    if snapshot.frame['work_order_id'].dtype != 'float64':
+        failures.append(f"snapshot work_order_id is {snapshot.frame['work_order_id'].dtype}, expected float64")
+
+    # int64 change set: updates (P1, 1, 100, 5) and deletes (P3, 3, 8, 6)
+    upserts = pd.DataFrame({'plant_id': ['P1'], 'part_id': [1], 'work_order_id': [100], 'vendor_id': [5],
+                            'on_hand_stock': [9]})
+    deleted = pd.DataFrame({'plant_id': ['P3'], 'part_id': [3], 'work_order_id': [8], 'vendor_id': [6]})
+    merged = snapshot.merge(upserts, deleted, KEY).frame
+
+    rows = merged[(merged['plant_id'] == 'P1') & (merged['work_order_id'] == 100)]
+    if len(rows) != 1 or rows['on_hand_stock'].iloc[0] != 9:
+        failures.append(f"updated key kept {len(rows)} rows: {rows['on_hand_stock'].tolist()}")
+    if (merged['plant_id'] == 'P3').any():
+        failures.append("deleted key is still in the snapshot")
+    if len(merged) != 3:
+        failures.append(f"merged snapshot has {len(merged)} rows, expected 3")
+    # Rows with NULL keys are untouched
+    if len(merged[merged['work_order_id'].isna() | merged['vendor_id'].isna()]) != 2:
+        failures.append("rows with NULL key columns were dropped")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())